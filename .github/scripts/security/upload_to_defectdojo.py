@@ -1,19 +1,28 @@
 #!/usr/bin/env python3
 # pylint: disable=missing-module-docstring,missing-class-docstring,missing-function-docstring,protected-access
+# pylint: disable=too-many-lines
 from __future__ import annotations
 
 import argparse
+import datetime
+import hashlib
+import http.client
 import io
+import json
 import os
+import random
+import re
 import ssl
 import sys
-import urllib.error
+import tempfile
+import threading
+import time
 import urllib.parse
-import urllib.request
 import uuid
-from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Callable, Iterable, Optional
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Optional, TextIO
 
 ALLOWED_EXACT_REPOS = {
     "postgis/postgis",
@@ -22,6 +31,21 @@ ALLOWED_EXACT_REPOS = {
 }
 ALLOWED_PREFIX_REPOS = ("ghcr.io/pvarki/",)
 SCAN_TYPE = "Anchore Grype"
+DEFAULT_CONCURRENCY = 4
+# Reimports of big reports keep DefectDojo busy for minutes, a timeout must mean it is stuck, not just slow
+REQUEST_TIMEOUT = 900.0
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+DEFAULT_STATE_FILE = ".defectdojo_upload_state.json"
+DEFAULT_JOURNAL_NAME = "upload_journal.json"
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF = 2.0
+RETRY_BACKOFF_MAX = 60.0
+COMPACT_READ_SIZE = 256 * 1024
+# What the DefectDojo "Anchore Grype" parser reads from each match, everything else in the report is dropped
+COMPACT_ARTIFACT_FIELDS = ("name", "version", "type", "purl")
+COMPACT_MATCH_DETAIL_FIELDS = ("type", "matcher")
+# Recomputed from the daily EPSS feed, uploaded but left out of the content hash so they alone do not trigger a reimport
+VOLATILE_VULNERABILITY_FIELDS = ("epss", "risk")
 
 
 @dataclass(frozen=True)
@@ -32,13 +56,18 @@ class UploadEntry:
 
 
 @dataclass(frozen=True)
-class UploadConfig:
+class UploadConfig:  # pylint: disable=too-many-instance-attributes
     base_url: str
     api_token: str
     product_type_name: str
     engagement_name: str
     verify_ssl: bool
     dry_run: bool
+    concurrency: int = DEFAULT_CONCURRENCY
+    force: bool = False
+    compact: bool = True
+    retries: int = DEFAULT_RETRIES
+    retry_backoff: float = RETRY_BACKOFF
 
 
 @dataclass
@@ -46,11 +75,332 @@ class UploadSummary:
     uploaded: int = 0
     failed: int = 0
     skipped: int = 0
+    unchanged: int = 0  # identical to the last successful upload, not sent again
+    resumed: int = 0  # uploaded by an earlier run of the same batch
+    timings: dict[str, float] = field(default_factory=dict)  # image_ref -> seconds spent in the uploader
 
 
 Uploader = Callable[[UploadConfig, UploadEntry], tuple[int, str]]
 
 
+class ResponseLostError(Exception):
+    """The request was sent in full but its response could not be read, the server may have acted on it"""
+
+    def __init__(self, error: BaseException) -> None:
+        super().__init__(f"no response to a request that was sent: {error!r}")
+        self.error = error
+
+
+_NON_WHITESPACE = re.compile(r"[^ \t\r\n]")
+_STRUCTURAL = re.compile(r'["\[\]{}]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_AFTER_NUMBER = re.compile(r"[^0-9.eE+\-]")
+_DECODER = json.JSONDecoder()
+
+
+class JsonStreamReader:
+    """Walks a JSON document from a text stream, holding only the value being decoded in memory"""
+
+    def __init__(self, stream: TextIO, read_size: int = COMPACT_READ_SIZE) -> None:
+        self.stream = stream
+        self.read_size = read_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.read_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            match = _NON_WHITESPACE.search(self.buffer, self.pos)
+            if match:
+                self.pos = match.start()
+                return self.buffer[self.pos]
+            self.pos = len(self.buffer)
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} but got {char or 'end of file'!r}")
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number is decoded up to where the buffer ends or up to a "." or "e" it ends with, either way the
+            # next chunk may continue it. It is complete once something that cannot be part of a number follows.
+            if (
+                isinstance(value, (int, float))
+                and not isinstance(value, bool)
+                and _AFTER_NUMBER.search(self.buffer, end) is None
+                and self._fill()
+            ):
+                continue
+            self.pos = end
+            return value
+
+    def skip(self) -> None:
+        if self.peek() not in ("[", "{"):
+            self.value()
+            return
+        depth = 0
+        in_string = False
+        while True:
+            match = (_STRING_SPECIAL if in_string else _STRUCTURAL).search(self.buffer, self.pos)
+            if match is None or (match.group() == "\\" and match.end() == len(self.buffer)):
+                self.pos = len(self.buffer) if match is None else match.start()
+                if not self._fill():
+                    raise ValueError("Unexpected end of file")
+                continue
+            char = match.group()
+            self.pos = match.end()
+            if in_string:
+                if char == "\\":
+                    self.pos += 1
+                else:
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in "[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def members(self) -> Iterator[str]:
+        """Keys of the object at the current position, the caller consumes each value before the next key"""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError(f"Expected an object key but got {key!r}")
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+    def items(self) -> Iterator[None]:
+        """Steps through the array at the current position, the caller consumes each item"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield None
+            if self.expect(",]") == "]":
+                return
+
+
+@dataclass(frozen=True)
+class CompactedReport:
+    sha256: str
+    original_bytes: int
+    compacted_bytes: int
+    matches: int
+    duplicates: int
+
+
+def compact_match(match: dict[str, Any]) -> dict[str, Any]:
+    artifact = match.get("artifact") or {}
+    compacted_artifact = {key: artifact[key] for key in COMPACT_ARTIFACT_FIELDS if key in artifact}
+    locations = [
+        {"path": location["path"]}
+        for location in artifact.get("locations") or []
+        if isinstance(location, dict) and location.get("path")
+    ]
+    if locations:
+        compacted_artifact["locations"] = locations
+    compacted = {
+        "vulnerability": match.get("vulnerability") or {},
+        "matchDetails": [
+            {key: detail[key] for key in COMPACT_MATCH_DETAIL_FIELDS if key in detail}
+            for detail in match.get("matchDetails") or []
+            if isinstance(detail, dict)
+        ],
+        "artifact": compacted_artifact,
+    }
+    if match.get("relatedVulnerabilities"):
+        compacted["relatedVulnerabilities"] = match["relatedVulnerabilities"]
+    return compacted
+
+
+def without_volatile_fields(compacted: dict[str, Any]) -> dict[str, Any]:
+    def stable(vulnerability: Any) -> Any:
+        if not isinstance(vulnerability, dict):
+            return vulnerability
+        return {key: value for key, value in vulnerability.items() if key not in VOLATILE_VULNERABILITY_FIELDS}
+
+    stable_match = {**compacted, "vulnerability": stable(compacted["vulnerability"])}
+    if "relatedVulnerabilities" in compacted:
+        stable_match["relatedVulnerabilities"] = [stable(related) for related in compacted["relatedVulnerabilities"]]
+    return stable_match
+
+
+def encode_match(match: dict[str, Any]) -> bytes:
+    return json.dumps(match, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def iter_report_matches(report_path: Path, read_size: int = COMPACT_READ_SIZE) -> Iterator[dict[str, Any]]:
+    with report_path.open("r", encoding="utf-8") as stream:
+        reader = JsonStreamReader(stream, read_size)
+        for key in reader.members():
+            if key != "matches":
+                reader.skip()
+                continue
+            for _ in reader.items():
+                match = reader.value()
+                if isinstance(match, dict):
+                    yield match
+        if reader.peek():
+            raise ValueError("Extra data after the report")
+
+
+def compact_report(
+    report_path: Path, output: Optional[BinaryIO] = None, read_size: int = COMPACT_READ_SIZE
+) -> CompactedReport:
+    """Stream the matches of a Grype report into {"matches": [...]} with only the fields DefectDojo reads.
+
+    Identical matches are written once. The SHA-256 of the compacted document is returned also when there is no
+    output, the scan metadata ("descriptor", "source" etc.) and the daily EPSS scores are not part of it.
+    """
+    digest = hashlib.sha256()
+    compacted_bytes = 0
+    matches = 0
+    duplicates = 0
+    seen: set[bytes] = set()
+
+    def write(data: bytes, hashed: bytes) -> None:
+        nonlocal compacted_bytes
+        digest.update(hashed)
+        compacted_bytes += len(data)
+        if output is not None:
+            output.write(data)
+
+    write(b'{"matches":[', b'{"matches":[')
+    for match in iter_report_matches(report_path, read_size):
+        compacted = compact_match(match)
+        encoded = encode_match(compacted)
+        match_digest = hashlib.sha256(encoded).digest()
+        if match_digest in seen:
+            duplicates += 1
+            continue
+        seen.add(match_digest)
+        stable = encode_match(without_volatile_fields(compacted))
+        separator = b"," if matches else b""
+        write(separator + encoded, separator + stable)
+        matches += 1
+    write(b"]}", b"]}")
+
+    return CompactedReport(digest.hexdigest(), report_path.stat().st_size, compacted_bytes, matches, duplicates)
+
+
+def report_content_hash(report_path: Path) -> str:
+    """SHA-256 of the compacted report, so scan time, tool versions and EPSS updates do not change it"""
+    return compact_report(report_path).sha256
+
+
+def entry_key(entry: UploadEntry) -> str:
+    return f"{entry.product_name}\t{entry.image_ref}"
+
+
+def utc_timestamp() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+
+
+def write_json_atomic(path: Path, data: Any) -> None:
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    tmp_path.write_text(json.dumps(data, indent=2, sort_keys=True), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+class UploadState:
+    """Content hash of the last successful upload per (product, image), kept between runs in a JSON file"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.uploads: dict[str, dict[str, str]] = {}
+        if path.is_file():
+            try:
+                self.uploads = json.loads(path.read_text(encoding="utf-8")).get("uploads", {})
+            except (ValueError, AttributeError):
+                print(f"Warning: ignoring unreadable upload state {path}", file=sys.stderr)
+
+    def unchanged(self, entry: UploadEntry, digest: str) -> bool:
+        return self.uploads.get(entry_key(entry), {}).get("sha256") == digest
+
+    def record(self, entry: UploadEntry, digest: str) -> None:
+        self.uploads[entry_key(entry)] = {
+            "sha256": digest,
+            "uploaded_at": utc_timestamp(),
+        }
+
+    def save(self) -> None:
+        write_json_atomic(self.path, {"uploads": self.uploads})
+
+
+class UploadJournal:
+    """Per-entry status of one upload batch, saved after every change so a rerun only redoes what did not finish"""
+
+    PENDING = "pending"
+    UPLOADED = "uploaded"
+    UNCHANGED = "unchanged"
+    FAILED = "failed"
+    UNKNOWN = "unknown"  # sent, but whether DefectDojo imported it is not known
+
+    def __init__(self, path: Path, restart: bool = False) -> None:
+        self.path = path
+        self.entries: dict[str, dict[str, str]] = {}
+        if path.is_file() and not restart:
+            try:
+                self.entries = json.loads(path.read_text(encoding="utf-8")).get("entries", {})
+            except (ValueError, AttributeError):
+                print(f"Warning: ignoring unreadable upload journal {path}", file=sys.stderr)
+
+    @staticmethod
+    def fingerprint(entry: UploadEntry) -> str:
+        stat = entry.report_path.stat()
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def finished(self, entry: UploadEntry) -> bool:
+        """Uploaded (or found unchanged) earlier in this batch and the report has not been rewritten since"""
+        record = self.entries.get(entry_key(entry), {})
+        return record.get("status") in (self.UPLOADED, self.UNCHANGED) and record.get("report") == self.fingerprint(
+            entry
+        )
+
+    def mark(self, entry: UploadEntry, status: str, error: str = "") -> None:
+        record = {"status": status, "report": self.fingerprint(entry), "updated_at": utc_timestamp()}
+        if error:
+            record["error"] = error
+        self.entries[entry_key(entry)] = record
+        self.save()
+
+    def save(self) -> None:
+        write_json_atomic(self.path, {"entries": self.entries})
+
+
 def _parse_dotenv_assignment(line: str) -> Optional[tuple[str, str]]:
     stripped = line.strip()
     if not stripped or stripped.startswith("#"):
@@ -233,28 +583,138 @@ def discover_report_entries(reports_dir: Path, manifest_path: Optional[Path]) ->
     return entries
 
 
-def build_multipart_payload(fields: dict[str, str], file_path: Path) -> tuple[str, bytes]:
+@dataclass(frozen=True)
+class MultipartBody:
+    """multipart/form-data body that streams the report from disk, iterable again for retries"""
+
+    boundary: str
+    preamble: bytes
+    file_path: Path
+    file_size: int
+    epilogue: bytes
+
+    @property
+    def content_length(self) -> int:
+        return len(self.preamble) + self.file_size + len(self.epilogue)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self.preamble
+        with self.file_path.open("rb") as report:
+            while chunk := report.read(UPLOAD_CHUNK_SIZE):
+                yield chunk
+        yield self.epilogue
+
+
+def build_multipart_body(fields: dict[str, str], file_path: Path) -> MultipartBody:
     boundary = f"----DefectDojoBoundary{uuid.uuid4().hex}"
-    body = io.BytesIO()
+    preamble = io.BytesIO()
 
     for key, value in fields.items():
-        body.write(f"--{boundary}\r\n".encode("utf-8"))
-        body.write(f'Content-Disposition: form-data; name="{key}"\r\n\r\n'.encode("utf-8"))
-        body.write(str(value).encode("utf-8"))
-        body.write(b"\r\n")
+        preamble.write(f"--{boundary}\r\n".encode("utf-8"))
+        preamble.write(f'Content-Disposition: form-data; name="{key}"\r\n\r\n'.encode("utf-8"))
+        preamble.write(str(value).encode("utf-8"))
+        preamble.write(b"\r\n")
+
+    preamble.write(f"--{boundary}\r\n".encode("utf-8"))
+    preamble.write(f'Content-Disposition: form-data; name="file"; filename="{file_path.name}"\r\n'.encode("utf-8"))
+    preamble.write(b"Content-Type: application/json\r\n\r\n")
+
+    return MultipartBody(
+        boundary=boundary,
+        preamble=preamble.getvalue(),
+        file_path=file_path,
+        file_size=file_path.stat().st_size,
+        epilogue=f"\r\n--{boundary}--\r\n".encode("utf-8"),
+    )
+
+
+def build_multipart_payload(fields: dict[str, str], file_path: Path) -> tuple[str, bytes]:
+    body = build_multipart_body(fields, file_path)
+    return body.boundary, b"".join(body)
+
+
+class ConnectionPool:
+    """Keep-alive connections to one DefectDojo host, safe to share between upload threads"""
+
+    def __init__(self, base_url: str, verify_ssl: bool, timeout: float = REQUEST_TIMEOUT) -> None:
+        parsed = urllib.parse.urlsplit(base_url)
+        self.scheme = parsed.scheme
+        self.netloc = parsed.netloc
+        self.base_path = parsed.path.rstrip("/")
+        self.timeout = timeout
+        self.ssl_context = ssl.create_default_context() if verify_ssl else ssl._create_unverified_context()
+        self._idle: list[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.netloc, timeout=self.timeout, context=self.ssl_context)
+        return http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+
+    def request(
+        self, method: str, path: str, body: bytes | Iterable[bytes], headers: dict[str, str]
+    ) -> tuple[int, bytes]:
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        reused = connection is not None
+        if connection is None:
+            connection = self._connect()
+        try:
+            connection.request(method, f"{self.base_path}{path}", body=body, headers=headers)
+        except (ConnectionResetError, BrokenPipeError):
+            connection.close()
+            if not reused:
+                raise
+            # The server had closed the idle keep-alive connection, it cannot have processed a request it did not
+            # receive in full. Once the request is sent, errors go to the caller, the server may have acted on it.
+            return self.request(method, path, body, headers)
+        except BaseException:
+            connection.close()
+            raise
+        try:
+            response = connection.getresponse()
+            response_body = response.read()
+        except (OSError, http.client.HTTPException) as error:
+            connection.close()
+            raise ResponseLostError(error) from error
+        except BaseException:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            with self._lock:
+                self._idle.append(connection)
+        return response.status, response_body
 
-    body.write(f"--{boundary}\r\n".encode("utf-8"))
-    body.write(f'Content-Disposition: form-data; name="file"; filename="{file_path.name}"\r\n'.encode("utf-8"))
-    body.write(b"Content-Type: application/json\r\n\r\n")
-    body.write(file_path.read_bytes())
-    body.write(b"\r\n")
-    body.write(f"--{boundary}--\r\n".encode("utf-8"))
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
 
-    return boundary, body.getvalue()
+
+_POOLS: dict[tuple[str, bool], ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_connection_pool(config: UploadConfig) -> ConnectionPool:
+    key = (config.base_url, config.verify_ssl)
+    with _POOLS_LOCK:
+        if key not in _POOLS:
+            _POOLS[key] = ConnectionPool(config.base_url, config.verify_ssl)
+        return _POOLS[key]
+
+
+def close_connection_pools() -> None:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
 
 
 def reimport_scan(config: UploadConfig, entry: UploadEntry) -> tuple[int, str]:
-    endpoint = f"{config.base_url.rstrip('/')}/api/v2/reimport-scan/"
     test_title = f"Grype {entry.image_ref}"
 
     fields = {
@@ -268,67 +728,237 @@ def reimport_scan(config: UploadConfig, entry: UploadEntry) -> tuple[int, str]:
         "do_not_reactivate": "false",
     }
 
-    boundary, payload = build_multipart_payload(fields, entry.report_path)
-    request = urllib.request.Request(endpoint, method="POST", data=payload)
-    request.add_header("Authorization", f"Token {config.api_token}")
-    request.add_header("Accept", "application/json")
-    request.add_header("Content-Type", f"multipart/form-data; boundary={boundary}")
+    # Streamed from disk with the exact length up front, the report is never held in memory
+    body = build_multipart_body(fields, entry.report_path)
+    headers = {
+        "Authorization": f"Token {config.api_token}",
+        "Accept": "application/json",
+        "Content-Type": f"multipart/form-data; boundary={body.boundary}",
+        "Content-Length": str(body.content_length),
+    }
+    status_code, response_body = get_connection_pool(config).request("POST", "/api/v2/reimport-scan/", body, headers)
+    return status_code, response_body.decode("utf-8", errors="replace")
+
 
-    ssl_context = None
-    if not config.verify_ssl:
-        ssl_context = ssl._create_unverified_context()
+_OUTPUT_LOCK = threading.Lock()
 
-    try:
-        with urllib.request.urlopen(request, context=ssl_context, timeout=120) as response:
-            response_body = response.read().decode("utf-8", errors="replace")
-            return response.getcode(), response_body
-    except urllib.error.HTTPError as error:
-        response_body = error.read().decode("utf-8", errors="replace")
-        return error.code, response_body
+
+def log(message: str) -> None:
+    """print() that does not interleave with lines printed from the upload threads"""
+    with _OUTPUT_LOCK:
+        print(message, flush=True)
+
+
+def is_transient_status(status_code: int) -> bool:
+    # 504 is a proxy giving up on DefectDojo, which may still be running the reimport: not retried, like timeouts
+    return status_code >= 500 and status_code != 504
+
+
+def upload_with_retries(uploader: Uploader, config: UploadConfig, entry: UploadEntry) -> tuple[int, str, float]:
+    """Upload, retrying 5xx responses and errors sending the request with exponential backoff.
+
+    4xx is final. So is ResponseLostError: the reimport may still be running and another one of the same test would
+    race it.
+    """
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        try:
+            status_code, response_body = uploader(config, entry)
+            if not is_transient_status(status_code) or attempt >= config.retries:
+                return status_code, response_body, time.monotonic() - started
+            reason = f"HTTP {status_code}"
+        except (OSError, http.client.HTTPException) as error:
+            if attempt >= config.retries:
+                raise
+            reason = repr(error)
+        delay = min(config.retry_backoff * 2**attempt, RETRY_BACKOFF_MAX) * random.uniform(0.5, 1.0)
+        attempt += 1
+        log(f"RETRY: {entry.report_path.name} -> {reason}, attempt {attempt + 1}/{config.retries + 1} in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def check_entry(entry: UploadEntry, config: UploadConfig, summary: UploadSummary) -> bool:
+    if not entry.report_path.is_file():
+        log(f"SKIP: report file does not exist: {entry.report_path}")
+        summary.skipped += 1
+        return False
+
+    if entry.report_path.stat().st_size == 0:
+        log(f"FAIL: report file is empty: {entry.report_path}")
+        summary.failed += 1
+        return False
+
+    if not is_allowed_repo(entry.product_name):
+        log(f"SKIP: repository is not in allowlist: {entry.product_name}")
+        summary.skipped += 1
+        return False
+
+    if config.dry_run:
+        log(
+            "DRY-RUN: would upload "
+            f"{entry.report_path} as product='{entry.product_name}' "
+            f"engagement='{config.engagement_name}'"
+        )
+        summary.uploaded += 1
+        return False
+
+    return True
+
+
+def format_size(size: int) -> str:
+    return f"{size / 1e6:.1f} MB" if size >= 1e6 else f"{size / 1e3:.1f} kB"
+
+
+def prepare_entry(entry: UploadEntry, config: UploadConfig, compact_dir: Path) -> tuple[UploadEntry, CompactedReport]:
+    """Compacted copy of the report to upload, or just its hash when compaction is off"""
+    if not config.compact:
+        return entry, compact_report(entry.report_path)
+
+    # Own directory per entry so the uploaded file keeps the report name
+    compacted_path = Path(tempfile.mkdtemp(dir=compact_dir)) / entry.report_path.name
+    with compacted_path.open("wb") as output:
+        compacted = compact_report(entry.report_path, output)
+    saved = compacted.original_bytes - compacted.compacted_bytes
+    log(
+        f"COMPACT: {entry.report_path.name} {format_size(compacted.original_bytes)} -> "
+        f"{format_size(compacted.compacted_bytes)} ({saved / max(compacted.original_bytes, 1):.0%} smaller), "
+        f"{compacted.matches} matches, {compacted.duplicates} duplicates dropped"
+    )
+    return replace(entry, report_path=compacted_path), compacted
+
+
+@dataclass(frozen=True)
+class PendingUpload:
+    entry: UploadEntry  # as listed in the manifest
+    upload: UploadEntry  # pointing to the file that is sent
+    sha256: str
+
+
+@dataclass
+class UploadRun:
+    """Accounts the outcome of each entry in the summary, the upload state and the journal"""
+
+    summary: UploadSummary = field(default_factory=UploadSummary)
+    state: Optional[UploadState] = None
+    journal: Optional[UploadJournal] = None
+
+    def finished_earlier(self, entry: UploadEntry) -> bool:
+        if self.journal is None or not self.journal.finished(entry):
+            return False
+        log(f"DONE: {entry.report_path.name} was uploaded earlier in this batch, skipping")
+        self.summary.resumed += 1
+        return True
+
+    def unchanged(self, entry: UploadEntry, digest: str, force: bool) -> bool:
+        if self.state is None or force or not self.state.unchanged(entry, digest):
+            return False
+        log(f"UNCHANGED: {entry.report_path.name} is identical to the last upload, skipping")
+        self.summary.unchanged += 1
+        self._mark(entry, UploadJournal.UNCHANGED)
+        return True
+
+    def pending(self, entry: UploadEntry) -> None:
+        self._mark(entry, UploadJournal.PENDING)
+
+    def uploaded(self, item: PendingUpload, status_code: int, elapsed: float) -> None:
+        log(f"OK: {item.entry.report_path.name} -> HTTP {status_code} in {elapsed:.1f}s")
+        self.summary.uploaded += 1
+        if self.state is not None:
+            self.state.record(item.entry, item.sha256)
+        self._mark(item.entry, UploadJournal.UPLOADED)
+
+    def failed(self, entry: UploadEntry, message: str, error: str, status: str = UploadJournal.FAILED) -> None:
+        log(f"FAIL: {message}")
+        self.summary.failed += 1
+        self._mark(entry, status, error)
+
+    def _mark(self, entry: UploadEntry, status: str, error: str = "") -> None:
+        if self.journal is not None:
+            self.journal.mark(entry, status, error)
 
 
 def process_uploads(
     entries: Iterable[UploadEntry],
     config: UploadConfig,
     uploader: Uploader = reimport_scan,
+    state: Optional[UploadState] = None,
+    journal: Optional[UploadJournal] = None,
 ) -> UploadSummary:
-    summary = UploadSummary()
-
+    run = UploadRun(state=state, journal=journal)
+    with tempfile.TemporaryDirectory(prefix="defectdojo_compact_") as compact_dir:
+        pending = select_uploads(entries, config, run, Path(compact_dir))
+        if pending:
+            upload_pending(pending, config, uploader, run)
+    return run.summary
+
+
+def select_uploads(
+    entries: Iterable[UploadEntry], config: UploadConfig, run: UploadRun, compact_dir: Path
+) -> list[PendingUpload]:
+    pending: list[PendingUpload] = []
     for entry in entries:
-        if not entry.report_path.is_file():
-            print(f"SKIP: report file does not exist: {entry.report_path}")
-            summary.skipped += 1
+        if not check_entry(entry, config, run.summary) or run.finished_earlier(entry):
             continue
 
-        if entry.report_path.stat().st_size == 0:
-            print(f"FAIL: report file is empty: {entry.report_path}")
-            summary.failed += 1
+        try:
+            upload_entry, compacted = prepare_entry(entry, config, compact_dir)
+        except ValueError as error:
+            run.failed(entry, f"report is not a valid Grype JSON report: {entry.report_path} ({error})", str(error))
             continue
-
-        if not is_allowed_repo(entry.product_name):
-            print(f"SKIP: repository is not in allowlist: {entry.product_name}")
-            summary.skipped += 1
+        if run.unchanged(entry, compacted.sha256, config.force):
             continue
 
-        if config.dry_run:
-            print(
-                "DRY-RUN: would upload "
-                f"{entry.report_path} as product='{entry.product_name}' "
-                f"engagement='{config.engagement_name}'"
-            )
-            summary.uploaded += 1
-            continue
+        run.pending(entry)
+        pending.append(PendingUpload(entry, upload_entry, compacted.sha256))
+    return pending
 
-        status_code, response_body = uploader(config, entry)
-        if 200 <= status_code < 300:
-            print(f"OK: {entry.report_path.name} -> HTTP {status_code}")
-            summary.uploaded += 1
-            continue
 
-        print(f"FAIL: {entry.report_path.name} -> HTTP {status_code} | " f"{response_body[:300].replace(chr(10), ' ')}")
-        summary.failed += 1
+def upload_pending(pending: list[PendingUpload], config: UploadConfig, uploader: Uploader, run: UploadRun) -> None:
+    # DefectDojo spends most of each reimport parsing, so a few uploads in flight hide most of the waiting.
+    # Results are accounted (and checkpointed in the journal) here in the main thread as they complete.
+    with ThreadPoolExecutor(max_workers=max(1, config.concurrency)) as executor:
+        futures: dict[Future[tuple[int, str, float]], PendingUpload] = {
+            executor.submit(upload_with_retries, uploader, config, item.upload): item for item in pending
+        }
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                status_code, response_body, elapsed = future.result()
+            except ResponseLostError as error:
+                message = f"{item.entry.report_path.name} -> {error} (DefectDojo may still finish this reimport)"
+                run.failed(item.entry, message, str(error), UploadJournal.UNKNOWN)
+                continue
+            except (OSError, http.client.HTTPException) as error:
+                run.failed(item.entry, f"{item.entry.report_path.name} -> {error!r}", repr(error))
+                continue
 
-    return summary
+            run.summary.timings[item.entry.image_ref] = elapsed
+            if 200 <= status_code < 300:
+                run.uploaded(item, status_code, elapsed)
+                continue
+
+            error_text = response_body[:300].replace(chr(10), " ")
+            run.failed(
+                item.entry,
+                f"{item.entry.report_path.name} -> HTTP {status_code} in {elapsed:.1f}s | {error_text}",
+                f"HTTP {status_code}: {error_text}",
+            )
+
+
+def print_summary(summary: UploadSummary, wall_time: float) -> None:
+    print(
+        "Upload summary: "
+        f"uploaded={summary.uploaded}, failed={summary.failed}, skipped={summary.skipped}, "
+        f"unchanged={summary.unchanged}, resumed={summary.resumed}"
+    )
+    if not summary.timings:
+        return
+    slowest = max(summary.timings, key=summary.timings.__getitem__)
+    print(
+        f"Upload timing: wall={wall_time:.1f}s, upload_total={sum(summary.timings.values()):.1f}s, "
+        f"slowest={slowest} ({summary.timings[slowest]:.1f}s)"
+    )
 
 
 def parse_bool(value: str) -> bool:
@@ -369,6 +999,37 @@ def parse_args() -> argparse.Namespace:
         help="Optional TSV manifest (defaults to <reports-dir>/manifest.tsv when present)",
     )
     parser.add_argument("--dry-run", action="store_true", help="Print actions without uploading")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=int(os.getenv("DD_UPLOAD_CONCURRENCY", str(DEFAULT_CONCURRENCY))),
+        help="Uploads in flight at the same time (DD_UPLOAD_CONCURRENCY)",
+    )
+    parser.add_argument(
+        "--state-file",
+        default=os.getenv("DD_UPLOAD_STATE", DEFAULT_STATE_FILE),
+        help="Hashes of the last successful uploads, unchanged reports are skipped (DD_UPLOAD_STATE)",
+    )
+    parser.add_argument("--force", action="store_true", help="Upload even reports identical to the last upload")
+    parser.add_argument(
+        "--journal",
+        default=os.getenv("DD_UPLOAD_JOURNAL"),
+        help=f"Status of each upload in this batch, a rerun only uploads what did not succeed "
+        f"(DD_UPLOAD_JOURNAL, defaults to {DEFAULT_JOURNAL_NAME} next to the manifest)",
+    )
+    parser.add_argument("--restart", action="store_true", help="Ignore the journal and upload the whole batch again")
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=int(os.getenv("DD_UPLOAD_RETRIES", str(DEFAULT_RETRIES))),
+        help="Retries with exponential backoff for 5xx responses, timeouts and connection errors (DD_UPLOAD_RETRIES)",
+    )
+    parser.add_argument(
+        "--no-compact",
+        dest="compact",
+        action="store_false",
+        help="Upload the reports as is instead of stripping them to the fields DefectDojo reads",
+    )
     parser.add_argument(
         "--verify-ssl",
         choices=["true", "false"],
@@ -388,6 +1049,19 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
+def resolve_manifest_path(manifest: Optional[str], reports_dir: Path) -> Optional[Path]:
+    if manifest:
+        return Path(manifest)
+    default_manifest = reports_dir / "manifest.tsv"
+    return default_manifest if default_manifest.exists() else None
+
+
+def journal_path(journal: Optional[str], manifest_path: Optional[Path], reports_dir: Path) -> Path:
+    if journal:
+        return Path(journal)
+    return (manifest_path.parent if manifest_path else reports_dir) / DEFAULT_JOURNAL_NAME
+
+
 def main() -> int:
     load_dotenv_file(Path(".env"))
     args = parse_args()
@@ -397,8 +1071,7 @@ def main() -> int:
         print(f"Reports directory does not exist: {reports_dir}", file=sys.stderr)
         return 2
 
-    verify_ssl_env = os.getenv("DD_VERIFY_SSL", "true")
-    verify_ssl_raw = args.verify_ssl if args.verify_ssl is not None else verify_ssl_env
+    verify_ssl_raw = args.verify_ssl if args.verify_ssl is not None else os.getenv("DD_VERIFY_SSL", "true")
     try:
         verify_ssl = parse_bool(verify_ssl_raw)
     except ValueError as error:
@@ -427,13 +1100,7 @@ def main() -> int:
     if args.dry_run and (not base_url or not api_token):
         print("Warning: DD_BASE_URL/DD_API_TOKEN missing; continuing because --dry-run is enabled.")
 
-    manifest_path: Optional[Path]
-    if args.manifest:
-        manifest_path = Path(args.manifest)
-    else:
-        default_manifest = reports_dir / "manifest.tsv"
-        manifest_path = default_manifest if default_manifest.exists() else None
-
+    manifest_path = resolve_manifest_path(args.manifest, reports_dir)
     entries = discover_report_entries(reports_dir, manifest_path)
     if not entries:
         print("No eligible Grype reports found for upload.")
@@ -446,10 +1113,24 @@ def main() -> int:
         engagement_name=args.engagement_name,
         verify_ssl=verify_ssl,
         dry_run=args.dry_run,
+        concurrency=args.concurrency,
+        force=args.force,
+        compact=args.compact,
+        retries=max(0, args.retries),
     )
 
-    summary = process_uploads(entries, config)
-    print("Upload summary: " f"uploaded={summary.uploaded}, failed={summary.failed}, skipped={summary.skipped}")
+    state = None if args.dry_run else UploadState(Path(args.state_file))
+    journal = (
+        None if args.dry_run else UploadJournal(journal_path(args.journal, manifest_path, reports_dir), args.restart)
+    )
+    started = time.monotonic()
+    try:
+        summary = process_uploads(entries, config, state=state, journal=journal)
+    finally:
+        close_connection_pools()
+        if state is not None:
+            state.save()
+    print_summary(summary, time.monotonic() - started)
 
     return 1 if summary.failed > 0 else 0
 
@@ -11,6 +11,7 @@ export SERVER_DOMAIN="localmaeher.dev.pvarki.fi"
 export CFSSL_CA_NAME="localmaeher"
 export MW_LE_EMAIL="example@example.com"
 export MW_LE_TEST="true"  # switch to false when you are ready for production
+# export MW_KEYTYPE="ecdsa"  # P-256 instead of RSA server certificates, cheaper TLS handshakes
 export TAKSERVER_CERT_PASS="KissaKoira123!AlpakkaMursu"  # used for the JKS
 export TAK_CA_PASS="AlpakkaMursu!KissaKoira123"  # used for the JKS
 export VITE_THEME="${VITE_THEME:-default}"  # used RMUI to define asset sets (logos, etc).
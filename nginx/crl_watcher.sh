@@ -1,7 +1,100 @@
 #!/bin/bash
-CRL_FILE=/ca_public/crl.pem
-echo "Waiting for "$CRL_FILE
-while inotifywait -e modify,move,create,delete "$CRL_FILE"; do
-    echo "CRL file changed. Reloading Nginx..."
-    pkill -HUP nginx
-done
+# Reload nginx when the CRL really changed.
+# Bursts of inotify events are coalesced until the directory has been quiet for CRL_DEBOUNCE seconds (or for at most
+# CRL_DEBOUNCE_MAX seconds from the first event, so a steady stream of writes cannot hold the reload back), then the CRL
+# is snapshotted, skipped if its hash did not change, verified against the CA chain and only then atomically
+# swapped into CRL_TARGET (the copy nginx reads) followed by a single reload.
+set -u
+CRL_SOURCE=${CRL_SOURCE:-/ca_public/crl.pem}
+CRL_TARGET=${CRL_TARGET:-/etc/nginx/crl/crl.pem}
+CRL_CA_FILE=${CRL_CA_FILE:-/ca_public/ca_chain.pem}
+CRL_DEBOUNCE=${CRL_DEBOUNCE:-2}
+CRL_DEBOUNCE_MAX=${CRL_DEBOUNCE_MAX:-10}
+CRL_RELOAD_CMD=${CRL_RELOAD_CMD:-nginx -s reload}
+
+RELOADS=0
+UNCHANGED=0
+REJECTED=0
+
+log() {
+    echo "crl_watcher: $*"
+}
+
+now_ms() {
+    local now=${EPOCHREALTIME/./}
+    echo $((now / 1000))
+}
+
+file_hash() {
+    sha256sum "$1" | cut -d' ' -f1
+}
+
+# Swap a verified copy of CRL_SOURCE into CRL_TARGET, returns 0 only if CRL_TARGET changed
+install_crl() {
+    local tmp
+    if [ ! -s "$CRL_SOURCE" ]; then
+        log "$CRL_SOURCE is missing or empty, keeping the current CRL"
+        return 1
+    fi
+    mkdir -p "$(dirname "$CRL_TARGET")"
+    # Same directory as the target so the final mv is an atomic rename, snapshot so the source can change under us
+    tmp=$(mktemp "$(dirname "$CRL_TARGET")/.crl.XXXXXX")
+    cp "$CRL_SOURCE" "$tmp"
+    if [ -f "$CRL_TARGET" ] && [ "$(file_hash "$tmp")" = "$(file_hash "$CRL_TARGET")" ]; then
+        UNCHANGED=$((UNCHANGED + 1))
+        rm -f "$tmp"
+        return 1
+    fi
+    # openssl 3.0 exits 0 when the signature does not verify (it only fails when the issuer is missing), so look at
+    # what it says
+    if ! openssl crl -in "$tmp" -noout -CAfile "$CRL_CA_FILE" 2>&1 | grep -q "^verify OK"; then
+        REJECTED=$((REJECTED + 1))
+        log "$CRL_SOURCE does not parse or verify against $CRL_CA_FILE, keeping the current CRL (rejected=$REJECTED)"
+        rm -f "$tmp"
+        return 1
+    fi
+    chmod 644 "$tmp"
+    mv -f "$tmp" "$CRL_TARGET"
+    return 0
+}
+
+DEBOUNCE_MS=$(awk "BEGIN { print int($CRL_DEBOUNCE * 1000) }")
+
+# Seconds to wait for the next event of a burst that started at $1, fails once CRL_DEBOUNCE_MAX has passed
+debounce_wait() {
+    local wait_ms=$(($1 + CRL_DEBOUNCE_MAX * 1000 - $(now_ms)))
+    [ "$wait_ms" -gt 0 ] || return 1
+    [ "$wait_ms" -lt "$DEBOUNCE_MS" ] || wait_ms=$DEBOUNCE_MS
+    printf '%d.%03d\n' $((wait_ms / 1000)) $((wait_ms % 1000))
+}
+
+# Handle one coalesced burst of events, $1 is the number of events and $2 when the first one arrived
+handle_burst() {
+    local events=$1 first_ms=$2
+    if ! install_crl; then
+        log "$events events, no reload (unchanged=$UNCHANGED rejected=$REJECTED)"
+        return
+    fi
+    if $CRL_RELOAD_CMD; then
+        RELOADS=$((RELOADS + 1))
+        log "$events events, reloaded in $(($(now_ms) - first_ms))ms after the first (reloads=$RELOADS)"
+    else
+        log "reload command failed"
+    fi
+}
+
+# nginx is not running yet when we start, it will read whatever we install now
+install_crl || true
+log "Watching $CRL_SOURCE"
+# Watch the directory, not the file: atomic writers replace the inode and a file watch would be lost
+inotifywait -m -q -e close_write,moved_to,create,delete --format '%f' "$(dirname "$CRL_SOURCE")" | {
+    while read -r name; do
+        [ "$name" = "$(basename "$CRL_SOURCE")" ] || continue
+        first_ms=$(now_ms)
+        events=1
+        while wait_s=$(debounce_wait "$first_ms") && read -r -t "$wait_s" name; do
+            [ "$name" = "$(basename "$CRL_SOURCE")" ] && events=$((events + 1))
+        done
+        handle_burst "$events" "$first_ms"
+    done
+}
@@ -3,4 +3,53 @@ set -ex
 cp -r /nginx_templates/$NGINX_TEMPLATE_DIR /etc/nginx/templates
 cp -r /nginx_templates/includes /etc/nginx/includes
 
+# envsubst leaves unset variables in the templates as is, which nginx would refuse.
+# A cached GOOD status is trusted until the responses nextUpdate, so caching delays revocations: opt-in.
+export NGINX_OCSP_CACHE=${NGINX_OCSP_CACHE:-off}
+
+# Keep-alive upstream group product_<name> for each product whose NGINX_<VAR>_UPSTREAM(_PORT) is set, the
+# consolidated template routes to these. Products may not be deployed, "resolve" lets nginx start without them and
+# picks up their containers when (and wherever) they appear.
+declare -A PRODUCT_UPSTREAM_VARS=([tak]=TAK [bl]=BL [fake]=FP [mtx]=RMMTX [matrix]=MATRIX)
+write_product_upstreams() {
+  local product var host port
+  for product in ${NGINX_UPSTREAM_PRODUCTS//,/ }; do
+    var=${PRODUCT_UPSTREAM_VARS[$product]:-}
+    [ -n "$var" ] || continue
+    host=NGINX_${var}_UPSTREAM
+    port=NGINX_${var}_UPSTREAM_PORT
+    [ -n "${!host:-}" ] && [ -n "${!port:-}" ] || continue
+    if [ -z "${DNS_RESOLVER_IP:-}" ]; then
+      # Without "resolve" nginx would refuse to start whenever this product is not deployed
+      echo "WARNING: DNS_RESOLVER_IP is not set, no keep-alive upstream for ${product}" >&2
+      continue
+    fi
+    echo "upstream product_${product} {"
+    echo "    zone product_${product} 64k;"
+    echo "    resolver ${DNS_RESOLVER_IP} valid=30s ipv6=off;"
+    echo "    server ${!host}:${!port} resolve;"
+    echo "    keepalive ${NGINX_UPSTREAM_KEEPALIVE:-16};"
+    echo "}"
+  done
+}
+NGINX_UPSTREAM_PRODUCTS=${NGINX_UPSTREAM_PRODUCTS:-$(IFS=,; echo "${!PRODUCT_UPSTREAM_VARS[*]}")}
+write_product_upstreams >/etc/nginx/conf.d/product_upstreams.conf
+
+# Products in NGINX_PRODUCT_CACHE get their X-Accel-Expires responses cached, list only ones whose API sends it
+for product in ${NGINX_PRODUCT_CACHE//,/ }; do
+  echo "product_${product} 0;"
+done >/etc/nginx/product_cache.map
+
+if [ -n "${NGINX_PRECOMPRESS_DIRS:-}" ]; then
+  /usr/local/bin/precompress.sh ${NGINX_PRECOMPRESS_DIRS//,/ }
+fi
+
+if [ "${NGINX_UI_MANIFEST:-false}" = "true" ]; then
+  /usr/local/bin/ui_manifest.sh &
+fi
+
+if [ "${NGINX_CRL_WATCHER:-false}" = "true" ]; then
+  /usr/local/bin/crl_watcher.sh &
+fi
+
 . /docker-entrypoint.sh
@@ -0,0 +1,61 @@
+#!/bin/bash
+# Write .gz (and .br when the brotli tool is installed) siblings for the content-hashed (immutable) static files under
+# the given directories for gzip_static, and a manifest of them. Only hashed files get siblings: a file keeping its
+# name can be re-delivered while nginx runs and its sibling would go stale, a hashed name always has the same content.
+# Files whose compressed sibling is newer are skipped, so running this on every start only costs a directory walk.
+set -u
+PRECOMPRESS_MIN_SIZE=${PRECOMPRESS_MIN_SIZE:-1024}
+PRECOMPRESS_MANIFEST=${PRECOMPRESS_MANIFEST:-asset-manifest.json}
+# Vite style names: index-BXe2k1Ab.js, the hash part being at least 8 characters
+HASHED_RE='-[A-Za-z0-9_]{8,}\.[a-z0-9]+$'
+
+log() {
+    echo "precompress: $*"
+}
+
+compress_one() {
+    local file=$1
+    if [ ! "$file.gz" -nt "$file" ]; then
+        gzip -9 -c "$file" >"$file.gz.tmp" && mv -f "$file.gz.tmp" "$file.gz"
+    fi
+    if command -v brotli >/dev/null && [ ! "$file.br" -nt "$file" ]; then
+        brotli -q 11 -c "$file" >"$file.br.tmp" && mv -f "$file.br.tmp" "$file.br"
+    fi
+}
+
+precompress_dir() {
+    local dir=$1 file name size gz_size first=1 compressed=0
+    local manifest="$dir/$PRECOMPRESS_MANIFEST"
+    {
+        echo "{"
+        echo "  \"generated\": \"$(date -u +%Y-%m-%dT%H:%M:%SZ)\","
+        echo "  \"immutable\": ["
+        while IFS= read -r -d '' file; do
+            size=$(stat -c %s "$file")
+            [ "$size" -ge "$PRECOMPRESS_MIN_SIZE" ] || continue
+            name=${file#"$dir"/}
+            [[ $name =~ $HASHED_RE ]] || continue
+            compress_one "$file"
+            compressed=$((compressed + 1))
+            gz_size=$(stat -c %s "$file.gz")
+            [ $first -eq 1 ] || echo ","
+            first=0
+            printf '    {"path": "/%s", "bytes": %s, "gzip_bytes": %s}' "$name" "$size" "$gz_size"
+        done < <(find "$dir" -type f \( -name '*.js' -o -name '*.mjs' -o -name '*.css' -o -name '*.html' \
+            -o -name '*.svg' -o -name '*.json' -o -name '*.map' -o -name '*.txt' -o -name '*.webmanifest' \) \
+            ! -name "$PRECOMPRESS_MANIFEST" -print0 | sort -z)
+        echo ""
+        echo "  ]"
+        echo "}"
+    } >"$manifest.tmp"
+    mv -f "$manifest.tmp" "$manifest"
+    log "$dir: $compressed files have compressed siblings, manifest in $manifest"
+}
+
+for dir in "$@"; do
+    if [ -d "$dir" ] && [ -w "$dir" ]; then
+        precompress_dir "$dir"
+    else
+        log "$dir is not a writable directory, skipping"
+    fi
+done
@@ -0,0 +1,74 @@
+#!/bin/bash
+# Keep a manifest of the product UI modules in UI_ROOT (one directory per product) so the SPA can discover them all
+# with one request instead of walking the autoindex listings. Rewritten (atomically) whenever a product changes its
+# files, bursts of events are coalesced until UI_ROOT has been quiet for UI_MANIFEST_DEBOUNCE seconds.
+set -u
+UI_ROOT=${UI_ROOT:-/ui_files}
+UI_URL_PREFIX=${UI_URL_PREFIX:-/ui}
+UI_MANIFEST=${UI_MANIFEST:-/var/cache/nginx/ui/manifest.json}
+UI_MANIFEST_DEBOUNCE=${UI_MANIFEST_DEBOUNCE:-2}
+# First of these found in the product directory is its entry module, otherwise the first .js file there
+UI_ENTRY_NAMES=${UI_ENTRY_NAMES:-remoteEntry.js index.js main.js}
+
+log() {
+    echo "ui_manifest: $*"
+}
+
+entry_module() {
+    local dir=$1 name file
+    for name in $UI_ENTRY_NAMES "$(basename "$dir").js"; do
+        if [ -f "$dir/$name" ]; then
+            echo "$name"
+            return
+        fi
+    done
+    for file in "$dir"/*.js; do
+        if [ -f "$file" ]; then
+            basename "$file"
+            return
+        fi
+    done
+}
+
+write_manifest() {
+    local dir product entry first=1 tmp
+    mkdir -p "$(dirname "$UI_MANIFEST")"
+    tmp=$(mktemp "$(dirname "$UI_MANIFEST")/.manifest.XXXXXX")
+    {
+        echo "{"
+        echo "  \"products\": {"
+        for dir in "$UI_ROOT"/*/; do
+            [ -d "$dir" ] || continue
+            dir=${dir%/}
+            product=$(basename "$dir")
+            entry=$(entry_module "$dir")
+            [ -n "$entry" ] || continue
+            [ $first -eq 1 ] || echo ","
+            first=0
+            printf '    "%s": {"entry": "%s/%s/%s", "sha256": "%s", "bytes": %s, "files": %s, "total_bytes": %s}' \
+                "$product" "$UI_URL_PREFIX" "$product" "$entry" \
+                "$(sha256sum "$dir/$entry" | cut -d' ' -f1)" "$(stat -c %s "$dir/$entry")" \
+                "$(find "$dir" -type f | wc -l)" "$(find "$dir" -type f -exec stat -c %s {} + | awk '{s+=$1} END {print s+0}')"
+        done
+        echo ""
+        echo "  }"
+        echo "}"
+    } >"$tmp"
+    chmod 644 "$tmp"
+    mv -f "$tmp" "$UI_MANIFEST"
+    log "Wrote $UI_MANIFEST"
+}
+
+write_manifest
+if [ "${1:-}" = "--once" ]; then
+    exit 0
+fi
+log "Watching $UI_ROOT"
+inotifywait -m -r -q -e close_write,moved_to,moved_from,create,delete --format '%w%f' "$UI_ROOT" | {
+    while read -r _path; do
+        while read -r -t "$UI_MANIFEST_DEBOUNCE" _path; do
+            :
+        done
+        write_manifest
+    done
+}
@@ -0,0 +1,53 @@
+"""Command line options and result output shared by the benchmarks"""
+
+from typing import Any, Mapping, Optional, Sequence
+from pathlib import Path
+import argparse
+import json
+import logging
+import ssl
+
+from .mtlscreds import MTLSCredentialCache
+
+
+def add_pfx_arguments(parser: argparse.ArgumentParser, presented_to: str) -> None:
+    """--pfx and --callsign, presented_to completes the --pfx help"""
+    parser.add_argument("--pfx", type=Path, help=f"Client PFX {presented_to} (password is the --callsign)")
+    parser.add_argument("--callsign", help="Callsign the --pfx belongs to, required with --pfx")
+
+
+def add_report_argument(parser: argparse.ArgumentParser, help_text: str = "Write results as JSON here") -> None:
+    """--report"""
+    parser.add_argument("--report", type=Path, help=help_text)
+
+
+def parse_args(parser: argparse.ArgumentParser) -> argparse.Namespace:
+    """Parse the command line, checking that --pfx comes with its --callsign"""
+    args = parser.parse_args()
+    if getattr(args, "pfx", None) and not args.callsign:
+        parser.error("--pfx needs --callsign, it is the PFX password")
+    return args
+
+
+def pfx_context(args: argparse.Namespace, credentials: MTLSCredentialCache) -> Optional[ssl.SSLContext]:
+    """Client SSL context for --pfx, None when not given"""
+    if not args.pfx:
+        return None
+    return credentials.add(args.callsign, args.pfx.read_bytes())
+
+
+def log_results(logger: logging.Logger, rows: Sequence[Mapping[str, Any]], precision: int = 3) -> None:
+    """One line of key=value pairs per result row"""
+    for row in rows:
+        logger.info(
+            ", ".join(
+                f"{key}={value:.{precision}f}" if isinstance(value, float) else f"{key}={value}"
+                for key, value in row.items()
+            )
+        )
+
+
+def write_report(path: Optional[Path], results: Any) -> None:
+    """Write results as JSON to path if given"""
+    if path:
+        path.write_text(json.dumps(results, indent=2), encoding="utf-8")
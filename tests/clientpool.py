@@ -0,0 +1,107 @@
+"""Shared pooled HTTP(S) client connections for the test harness"""
+
+from typing import Dict, Optional, Any, Mapping
+from dataclasses import dataclass
+from pathlib import Path
+import logging
+import ssl
+import types
+
+import aiohttp
+
+from .mtlscreds import MTLSCredentialCache
+
+LOGGER = logging.getLogger(__name__)
+
+
+def testcas_ssl_context(ca_path: Path) -> ssl.SSLContext:
+    """SSL context trusting the default CAs and every *ca*.pem from ca_path"""
+    ssl_ctx = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    LOGGER.info("Loading local CA certs from {}".format(ca_path))
+    for cafile in ca_path.glob("*ca*.pem"):
+        if not cafile.is_file():
+            continue
+        LOGGER.debug("Adding cert {}".format(cafile))
+        ssl_ctx.load_verify_locations(str(cafile))
+    return ssl_ctx
+
+
+@dataclass
+class ConnectionCounters:
+    """How many connections were opened (and thus TLS handshakes done) vs taken from the keep-alive pool"""
+
+    handshakes: int = 0
+    reused: int = 0
+
+
+class ClientFactory:  # pylint: disable=too-many-instance-attributes
+    """Hands out aiohttp sessions that share keep-alive connection pools
+
+    Sessions are cheap and can carry their own headers, the connectors behind them (one per SSL context)
+    live until close() is called."""
+
+    def __init__(
+        self,
+        ca_path: Path,
+        *,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        keepalive_timeout: float = 60.0,
+    ) -> None:
+        self.ca_path = ca_path
+        self.ssl_ctx = testcas_ssl_context(ca_path)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.counters = ConnectionCounters()
+        self.credentials = MTLSCredentialCache(ca_path)
+        # Keep the contexts referenced so their ids stay unique while the connector lives
+        self._connectors: Dict[int, aiohttp.TCPConnector] = {}
+        self._contexts: Dict[int, ssl.SSLContext] = {}
+        self._trace = aiohttp.TraceConfig()
+        self._trace.on_connection_create_end.append(self._on_create)
+        self._trace.on_connection_reuseconn.append(self._on_reuse)
+
+    async def _on_create(self, _session: aiohttp.ClientSession, _ctx: types.SimpleNamespace, _params: Any) -> None:
+        self.counters.handshakes += 1
+
+    async def _on_reuse(self, _session: aiohttp.ClientSession, _ctx: types.SimpleNamespace, _params: Any) -> None:
+        self.counters.reused += 1
+
+    def connector(self, ssl_ctx: Optional[ssl.SSLContext] = None) -> aiohttp.TCPConnector:
+        """Get the pooled connector for given SSL context (default: the CA-only one), must be called in the loop"""
+        if ssl_ctx is None:
+            ssl_ctx = self.ssl_ctx
+        key = id(ssl_ctx)
+        if key not in self._connectors or self._connectors[key].closed:
+            self._contexts[key] = ssl_ctx
+            self._connectors[key] = aiohttp.TCPConnector(
+                ssl=ssl_ctx,
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+        return self._connectors[key]
+
+    def session(
+        self, ssl_ctx: Optional[ssl.SSLContext] = None, headers: Optional[Mapping[str, str]] = None
+    ) -> aiohttp.ClientSession:
+        """New session on top of the shared pool, closing it leaves the pooled connections open"""
+        return aiohttp.ClientSession(
+            connector=self.connector(ssl_ctx),
+            connector_owner=False,
+            headers=headers,
+            trace_configs=[self._trace],
+        )
+
+    async def close(self) -> None:
+        """Close all the pooled connections"""
+        LOGGER.info(
+            "Client pool closing, {} handshakes, {} reused connections".format(
+                self.counters.handshakes, self.counters.reused
+            )
+        )
+        for connector in self._connectors.values():
+            await connector.close()
+        self._connectors.clear()
+        self._contexts.clear()
@@ -1,13 +1,12 @@
 """The conftest.py provides fixtures for the entire directory.
 Fixtures defined can be used by any test in that package without needing to import them."""
 
-from typing import Dict, AsyncGenerator
+from typing import Any, Dict, AsyncGenerator, Generator
 import platform
 import logging
 import string
 import random
 from pathlib import Path
-import ssl
 import asyncio
 import uuid
 import os
@@ -18,6 +17,8 @@ import pytest_asyncio
 from libadvian.logging import init_logging
 from multikeyjwt import Issuer
 
+from .clientpool import ClientFactory
+from .waiting import ConditionTimings
 
 init_logging(logging.DEBUG)
 LOGGER = logging.getLogger(__name__)
@@ -37,21 +38,29 @@ if platform.system() == "Windows":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
 
+@pytest_asyncio.fixture(scope="session")
+async def client_factory() -> AsyncGenerator[ClientFactory, None]:
+    """Keep-alive connection pools shared by every session fixture"""
+    factory = ClientFactory(CA_PATH)
+    yield factory
+    await factory.close()
+
+
 @pytest_asyncio.fixture
-async def session_with_testcas() -> AsyncGenerator[aiohttp.ClientSession, None]:
+async def session_with_testcas(client_factory: ClientFactory) -> AsyncGenerator[aiohttp.ClientSession, None]:
     """aiohttp session with the mkcert CA enabled"""
-    ssl_ctx = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
-    LOGGER.info("Loading local CA certs from {}".format(CA_PATH))
-    for cafile in CA_PATH.glob("*ca*.pem"):
-        if not cafile.is_file():
-            continue
-        LOGGER.debug("Adding cert {}".format(cafile))
-        ssl_ctx.load_verify_locations(str(cafile))
-    conn = aiohttp.TCPConnector(ssl=ssl_ctx)
-    async with aiohttp.ClientSession(connector=conn) as session:
+    async with client_factory.session() as session:
         yield session
 
 
+@pytest.fixture(scope="session")
+def condition_timings() -> Generator[ConditionTimings, None, None]:
+    """Collect how long the wait_until conditions took, logged at the end of the session"""
+    timings = ConditionTimings()
+    yield timings
+    timings.log_report()
+
+
 @pytest.fixture(scope="session")
 def tp_issuer() -> Issuer:
     """Issuer initialized with miniwerk key"""
@@ -112,15 +121,28 @@ async def session_with_invalid_tpjwt(
     yield session
 
 
-@pytest.fixture
-def call_sign_generator() -> str:
-    """Return random work_id"""
+def random_callsign() -> str:
+    """Return random callsign"""
     ret = "".join(random.choice(string.ascii_uppercase + string.digits) for _ in range(6))
     ret += "_"
     ret += "".join(random.choice(string.ascii_uppercase + string.digits) for _ in range(2))
     return ret
 
 
+@pytest.fixture(scope="module")
+def values(request: pytest.FixtureRequest) -> Any:
+    """Fresh instance of the test module's ValueStorage dataclass
+
+    Each scenario module gets its own state so modules can run in parallel (pytest -n auto --dist loadfile)."""
+    return request.module.ValueStorage()
+
+
+@pytest.fixture
+def call_sign_generator() -> str:
+    """Return random work_id"""
+    return random_callsign()
+
+
 # FIXME: rename this, or if only needed in one test file=module, move it there
 @pytest.fixture
 def testdata() -> Dict[str, str]:
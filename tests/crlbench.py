@@ -0,0 +1,192 @@
+"""Bytes transferred and latency of full vs conditional CRL fetches as the CRL grows
+
+Against the running composition (CRL size is whatever it currently is)::
+
+    python -m tests.crlbench --url https://localmaeher.dev.pvarki.fi:4439/ca/crl/
+
+Against in-process stubs prefilled with growing CRLs::
+
+    python -m tests.crlbench --sizes 100,1000,10000,50000
+
+Parse cost of base CRLs of growing size vs a delta CRL with --delta-entries revocations, both in Python and with
+the openssl CLI (which loads CRLs the same way nginx does)::
+
+    python -m tests.crlbench --parse --sizes 1000,10000,50000 --delta-entries 100
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+from dataclasses import dataclass
+import argparse
+import asyncio
+import logging
+import socket
+import subprocess  # nosec
+import time
+
+import aiohttp
+from aiohttp import web
+from cryptography import x509
+from libadvian.logging import init_logging
+
+from .benchcli import add_report_argument, log_results, parse_args, write_report
+from .clientpool import testcas_ssl_context
+from .conftest import CA_PATH
+from .loadgen import percentile
+from .stubapi import JWT_PATH, StubAPI, StubCA, load_jwt_keys
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CRLFetch:
+    """One GET of the CRL"""
+
+    status: int
+    received: int  # status line, header and body bytes as received
+    elapsed: float
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+    def validators(self) -> Dict[str, str]:
+        """Conditional request headers for fetching the CRL again"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+async def fetch_crl(session: aiohttp.ClientSession, url: str, headers: Optional[Dict[str, str]] = None) -> CRLFetch:
+    """GET the CRL, optionally conditionally"""
+    started = time.perf_counter()
+    async with session.get(url, headers=headers) as resp:
+        body = await resp.read()
+        elapsed = time.perf_counter() - started
+        header_bytes = sum(len(name) + len(value) + 4 for name, value in resp.raw_headers) + 2
+        return CRLFetch(
+            status=resp.status,
+            received=len(f"HTTP/1.1 {resp.status} {resp.reason}\r\n") + header_bytes + len(body),
+            elapsed=elapsed,
+            etag=resp.headers.get("ETag"),
+            last_modified=resp.headers.get("Last-Modified"),
+        )
+
+
+def summarize(name: str, fetches: Sequence[CRLFetch]) -> Dict[str, Any]:
+    """Bytes and latency distribution for a set of fetches"""
+    latencies = [fetch.elapsed for fetch in fetches]
+    return {
+        "mode": name,
+        "n": len(fetches),
+        "statuses": sorted({fetch.status for fetch in fetches}),
+        "bytes_per_fetch": sum(fetch.received for fetch in fetches) / len(fetches),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+    }
+
+
+async def bench_url(session: aiohttp.ClientSession, url: str, rounds: int = 20) -> List[Dict[str, Any]]:
+    """Full fetches vs conditional refetches of an unchanged CRL"""
+    full = [await fetch_crl(session, url) for _ in range(rounds)]
+    assert full[-1].status == 200, f"{url} returned {full[-1].status}"
+    validators = full[-1].validators()
+    if not validators:
+        LOGGER.warning("{} sends no validators, conditional fetches are full fetches".format(url))
+    conditional = [await fetch_crl(session, url, validators) for _ in range(rounds)]
+    return [summarize("full", full), summarize("conditional", conditional)]
+
+
+async def bench_stub_sizes(sizes: Sequence[int], rounds: int = 20) -> List[Dict[str, Any]]:
+    """Run bench_url against an in-process stub for each CRL size"""
+    issuer, verifier = load_jwt_keys(JWT_PATH / "miniwerk.key")
+    stub = StubAPI(issuer, verifier)
+    runner = web.AppRunner(stub.create_app(), access_log=None)
+    await runner.setup()
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    results: List[Dict[str, Any]] = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            for size in sorted(sizes):
+                stub.ca.prefill(size - len(stub.ca.revoked))
+                stub.ca.crl()  # Sign outside the measurements
+                for row in await bench_url(session, f"http://127.0.0.1:{port}/api/v1/utils/crl", rounds):
+                    results.append({"entries": size, **row})
+    finally:
+        await runner.cleanup()
+    return results
+
+
+def python_parse_seconds(der: bytes) -> float:
+    """Load the CRL and walk all of its entries"""
+    started = time.perf_counter()
+    sum(1 for _ in x509.load_der_x509_crl(der))
+    return time.perf_counter() - started
+
+
+def openssl_parse_seconds(der: bytes, rounds: int = 3) -> float:
+    """Best wall time of openssl crl loading the CRL (includes the process start)"""
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        subprocess.run(["openssl", "crl", "-inform", "DER", "-noout"], input=der, check=True)  # nosec
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_parse(sizes: Sequence[int], delta_entries: int = 100) -> List[Dict[str, Any]]:
+    """Parse cost of the full CRL vs a delta CRL as the revoked population grows"""
+    results: List[Dict[str, Any]] = []
+    for size in sorted(sizes):
+        stubca = StubCA(keytype="ecdsa", delta_limit=delta_entries)
+        stubca.prefill(size)
+        base = stubca.crl().der
+        for serial in range(1, delta_entries + 1):
+            stubca.revoke(serial)
+        delta = stubca.delta_crl().der
+        results.append(
+            {
+                "entries": size,
+                "base_bytes": len(base),
+                "base_python_s": python_parse_seconds(base),
+                "base_openssl_s": openssl_parse_seconds(base),
+                "delta_entries": delta_entries,
+                "delta_bytes": len(delta),
+                "delta_python_s": python_parse_seconds(delta),
+                "delta_openssl_s": openssl_parse_seconds(delta),
+            }
+        )
+    return results
+
+
+async def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Pick the mode from args"""
+    if args.parse:
+        return bench_parse([int(size) for size in args.sizes.split(",")], args.delta_entries)
+    if args.url:
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=testcas_ssl_context(CA_PATH))) as session:
+            return await bench_url(session, args.url, args.rounds)
+    return await bench_stub_sizes([int(size) for size in args.sizes.split(",")], args.rounds)
+
+
+def main() -> None:
+    """Run the benchmark from command line"""
+    parser = argparse.ArgumentParser(description="Full vs conditional CRL fetch benchmark")
+    parser.add_argument("--url", help="CRL URL to benchmark, default is to run in-process stubs")
+    parser.add_argument("--sizes", default="100,1000,10000,50000", help="CRL entries for the stub runs")
+    parser.add_argument("--rounds", type=int, default=20, help="Fetches per mode")
+    parser.add_argument("--parse", action="store_true", help="Benchmark parsing base vs delta CRLs of --sizes")
+    parser.add_argument("--delta-entries", type=int, default=100, help="Revocations in the delta CRL for --parse")
+    add_report_argument(parser)
+    args = parse_args(parser)
+    init_logging(logging.INFO)
+    results = asyncio.run(run(args))
+    log_results(LOGGER, results, precision=4)
+    write_report(args.report, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Many clients downloading data packages at the same time, like a platoon scanning the same QR code
+
+Every URL is downloaded once (ephemeral links are one-time), or --repeat times when the link allows it::
+
+    python -m tests.dlbench --urls-file links.txt --concurrency 40
+    python -m tests.dlbench --url https://tak.localmaeher.dev.pvarki.fi:4627/ephemeral/api/... --repeat 200
+
+Run it with the product API streaming the package and again with it answering X-Accel-Redirect to compare.
+"""
+
+from typing import Any, Dict, List, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+import argparse
+import asyncio
+import logging
+import time
+
+import aiohttp
+from libadvian.logging import init_logging
+
+from .benchcli import add_pfx_arguments, add_report_argument, log_results, parse_args, pfx_context, write_report
+from .clientpool import ClientFactory
+from .conftest import CA_PATH
+from .loadgen import percentile
+
+LOGGER = logging.getLogger(__name__)
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass(frozen=True)
+class Download:
+    """One completed (or failed) download"""
+
+    status: int
+    size: int
+    first_byte: float
+    elapsed: float
+
+
+async def download(session: aiohttp.ClientSession, url: str) -> Download:
+    """GET url reading the body in chunks like a client saving it would"""
+    started = time.perf_counter()
+    size = 0
+    async with session.get(url) as resp:
+        first_byte = time.perf_counter() - started
+        async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+            size += len(chunk)
+    return Download(resp.status, size, first_byte, time.perf_counter() - started)
+
+
+async def bench_downloads(session: aiohttp.ClientSession, urls: Sequence[str], concurrency: int) -> Dict[str, Any]:
+    """Download all urls with at most concurrency in flight"""
+    slots = asyncio.Semaphore(concurrency)
+
+    async def limited(url: str) -> Download:
+        async with slots:
+            return await download(session, url)
+
+    started = time.perf_counter()
+    downloads = await asyncio.gather(*(limited(url) for url in urls))
+    wall_time = time.perf_counter() - started
+    ok = [item for item in downloads if item.status == 200]
+    elapsed = [item.elapsed for item in ok]
+    return {
+        "downloads": len(downloads),
+        "failed": len(downloads) - len(ok),
+        "concurrency": concurrency,
+        "megabytes": sum(item.size for item in ok) / 1e6,
+        "megabytes_per_second": sum(item.size for item in ok) / 1e6 / wall_time,
+        "first_byte_p50": percentile([item.first_byte for item in ok], 50),
+        "first_byte_p95": percentile([item.first_byte for item in ok], 95),
+        "download_p50": percentile(elapsed, 50),
+        "download_p95": percentile(elapsed, 95),
+        "wall_time": wall_time,
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Collect the urls and run the downloads"""
+    urls: List[str] = list(args.url)
+    if args.urls_file:
+        urls += [line.strip() for line in args.urls_file.read_text(encoding="utf-8").splitlines() if line.strip()]
+    urls = urls * args.repeat
+    factory = ClientFactory(CA_PATH, limit=args.concurrency, limit_per_host=args.concurrency)
+    ssl_ctx = pfx_context(args, factory.credentials)
+    try:
+        async with factory.session(ssl_ctx) as session:
+            return await bench_downloads(session, urls, args.concurrency)
+    finally:
+        await factory.close()
+
+
+def main() -> None:
+    """Run the benchmark from command line"""
+    parser = argparse.ArgumentParser(description="Concurrent data package downloads")
+    parser.add_argument("--url", action="append", default=[], help="URL to download, can be given multiple times")
+    parser.add_argument("--urls-file", type=Path, help="File with one URL per line")
+    parser.add_argument("--repeat", type=int, default=1, help="Download every URL this many times")
+    parser.add_argument("--concurrency", type=int, default=40, help="Parallel downloads")
+    add_pfx_arguments(parser, "if the URLs need one")
+    add_report_argument(parser)
+    args = parse_args(parser)
+    if not args.url and not args.urls_file:
+        parser.error("Give --url or --urls-file")
+    init_logging(logging.INFO)
+    result = asyncio.run(run(args))
+    log_results(LOGGER, [result])
+    write_report(args.report, result)
+
+
+if __name__ == "__main__":
+    main()
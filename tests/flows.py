@@ -0,0 +1,91 @@
+"""API flows shared by the load and probe scenarios"""
+
+from typing import Tuple
+from dataclasses import dataclass
+import uuid
+
+import aiohttp
+from multikeyjwt import Issuer
+
+from .conftest import DEFAULT_TIMEOUT, API, VER, random_callsign
+
+
+def mtls_url(api: str = API) -> str:
+    """The mtls. host variant of the API base"""
+    if "localmaeher" in api:
+        return api.replace("localmaeher", "mtls.localmaeher")
+    return api.replace("https://", "https://mtls.")
+
+
+async def create_admin(client: aiohttp.ClientSession, tp_issuer: Issuer) -> Tuple[str, bytes]:
+    """Create a fresh admin the same way test_cert_bundle does, returns callsign and PFX"""
+    tpjwt = tp_issuer.issue({"sub": "tpadminsession", "anon_admin_session": True, "nonce": str(uuid.uuid4())})
+    resp = await client.post(
+        f"{API}/{VER}/token/code/generate",
+        json={"claims": {"anon_admin_session": True}},
+        headers={"Authorization": f"Bearer {tpjwt}"},
+        timeout=DEFAULT_TIMEOUT,
+    )
+    resp.raise_for_status()
+    resp = await client.post(
+        f"{API}/{VER}/token/code/exchange", json={"code": (await resp.json())["code"]}, timeout=DEFAULT_TIMEOUT
+    )
+    resp.raise_for_status()
+    logintoken_jwt = (await resp.json())["jwt"]
+    callsign = random_callsign()
+    resp = await client.post(
+        f"{API}/{VER}/firstuser/add-admin",
+        json={"callsign": callsign},
+        headers={"Authorization": f"Bearer {logintoken_jwt}"},
+        timeout=DEFAULT_TIMEOUT,
+    )
+    resp.raise_for_status()
+    resp = await client.post(
+        f"{API}/{VER}/token/code/exchange",
+        json={"code": (await resp.json())["jwt_exchange_code"]},
+        timeout=DEFAULT_TIMEOUT,
+    )
+    resp.raise_for_status()
+    admin_jwt = (await resp.json())["jwt"]
+    resp = await client.get(
+        f"{API}/{VER}/enduserpfx/{callsign}",
+        headers={"Authorization": f"Bearer {admin_jwt}"},
+        timeout=DEFAULT_TIMEOUT,
+    )
+    resp.raise_for_status()
+    return callsign, await resp.read()
+
+
+@dataclass(frozen=True)
+class EnrolledUser:
+    """Accepted user with their credentials"""
+
+    callsign: str
+    jwt: str
+    pfx: bytes
+
+
+async def enroll_user(admin: aiohttp.ClientSession, client: aiohttp.ClientSession) -> EnrolledUser:
+    """invitecode create -> enroll -> accept -> enduserpfx, admin must be an mTLS admin session"""
+    resp = await admin.post(f"{mtls_url()}/{VER}/enrollment/invitecode/create", timeout=DEFAULT_TIMEOUT)
+    resp.raise_for_status()
+    resp = await client.post(
+        f"{API}/{VER}/enrollment/invitecode/enroll",
+        json={"invite_code": (await resp.json())["invite_code"], "callsign": random_callsign()},
+        timeout=DEFAULT_TIMEOUT,
+    )
+    resp.raise_for_status()
+    payload = await resp.json()
+    async with admin.post(
+        f"{mtls_url()}/{VER}/enrollment/accept",
+        json={"callsign": payload["callsign"], "approvecode": payload["approvecode"]},
+        timeout=DEFAULT_TIMEOUT,
+    ) as resp:
+        resp.raise_for_status()
+    resp = await client.get(
+        f"{API}/{VER}/enduserpfx/{payload['callsign']}.pfx",
+        headers={"Authorization": f"Bearer {payload['jwt']}"},
+        timeout=DEFAULT_TIMEOUT,
+    )
+    resp.raise_for_status()
+    return EnrolledUser(payload["callsign"], payload["jwt"], await resp.read())
@@ -0,0 +1,117 @@
+"""Stock of pre-generated private keys so certificate issuance does not wait for keygen"""
+
+from typing import Any, Callable, Deque, Dict, Optional, Set, Union
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import logging
+import os
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+LOGGER = logging.getLogger(__name__)
+UserKey = Union[rsa.RSAPrivateKey, ec.EllipticCurvePrivateKey]
+
+
+def generate_key(keytype: str = "rsa", keysize: int = 2048) -> UserKey:
+    """New RSA key of keysize bits or ECDSA P-256 key (keysize ignored)"""
+    if keytype == "ecdsa":
+        return ec.generate_private_key(ec.SECP256R1())
+    if keytype == "rsa":
+        return rsa.generate_private_key(public_exponent=65537, key_size=keysize)
+    raise ValueError(f"Unknown key type {keytype}")
+
+
+def generate_rsa_der(keysize: int) -> bytes:
+    """New RSA key as unencrypted PKCS8 DER (key objects do not pickle across processes)"""
+    return key_der(generate_key("rsa", keysize))
+
+
+def generate_ecdsa_der(_keysize: int) -> bytes:
+    """New ECDSA P-256 key as unencrypted PKCS8 DER"""
+    return key_der(generate_key("ecdsa"))
+
+
+def key_der(key: UserKey) -> bytes:
+    """Unencrypted PKCS8 DER"""
+    return key.private_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+
+
+DER_GENERATORS: Dict[str, Callable[[int], bytes]] = {"rsa": generate_rsa_der, "ecdsa": generate_ecdsa_der}
+
+
+class KeyPool:  # pylint: disable=too-many-instance-attributes
+    """Keeps up to target keys ready, refilled in the background from a process pool
+
+    take() never blocks: it returns None when the stock is empty and the caller generates the key inline."""
+
+    def __init__(
+        self, target: int, generate: Callable[[int], bytes] = generate_rsa_der, keysize: int = 2048, workers: int = 2
+    ) -> None:
+        self.target = target
+        self.generate = generate
+        self.keysize = keysize
+        self.workers = workers
+        self.hits = 0
+        self.misses = 0
+        self._stock: Deque[UserKey] = deque()
+        self._pending: Set["asyncio.Future[bytes]"] = set()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __len__(self) -> int:
+        return len(self._stock)
+
+    async def start(self, _app: Any = None) -> None:
+        """Start the workers and the initial fill, usable as aiohttp on_startup hook"""
+        if self.target < 1:
+            return
+        # Refilling must not compete with the requests the pool is there to speed up
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=os.nice, initargs=(10,))
+        self.refill()
+
+    async def close(self, _app: Any = None) -> None:
+        """Stop refilling, usable as aiohttp on_cleanup hook"""
+        for future in self._pending:
+            future.cancel()
+        if not self._executor:
+            return
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        LOGGER.info("Key pool closing, {} hits, {} misses, {} keys unused".format(self.hits, self.misses, len(self)))
+
+    def refill(self) -> None:
+        """Submit keygen jobs until stock plus in-flight jobs reach the target"""
+        if not self._executor:
+            return
+        loop = asyncio.get_running_loop()
+        while len(self._stock) + len(self._pending) < self.target:
+            future = loop.run_in_executor(self._executor, self.generate, self.keysize)
+            self._pending.add(future)
+            future.add_done_callback(self._stock_up)
+
+    def _stock_up(self, future: "asyncio.Future[bytes]") -> None:
+        self._pending.discard(future)
+        if future.cancelled():
+            return
+        if future.exception():
+            LOGGER.error("Key generation failed: {!r}".format(future.exception()))
+            return
+        key = serialization.load_der_private_key(future.result(), password=None)
+        assert isinstance(key, (rsa.RSAPrivateKey, ec.EllipticCurvePrivateKey))
+        self._stock.append(key)
+
+    def take(self) -> Optional[UserKey]:
+        """Ready key or None if the stock is empty, schedules a refill either way"""
+        key: Optional[UserKey] = None
+        if self._stock:
+            key = self._stock.popleft()
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.refill()
+        return key
@@ -0,0 +1,139 @@
+"""Load generation helpers for running scenario flows for many concurrent virtual users"""
+
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from dataclasses import dataclass, field
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import math
+import os
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile, samples do not need to be sorted"""
+    if not samples:
+        return math.nan
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+@dataclass(frozen=True)
+class LoadProfile:
+    """How many virtual users to run and how fast they arrive"""
+
+    users: int
+    arrival_rate: float = 5.0  # users per second once ramp-up is done
+    ramp_up: float = 0.0  # seconds to linearly ramp the arrival rate from 0 to arrival_rate
+
+    @classmethod
+    def from_env(cls, prefix: str = "RM_LOAD_") -> "LoadProfile":
+        """Read the profile from environment, users defaults to 0 (ie. load mode disabled)"""
+        return cls(
+            users=int(os.environ.get(f"{prefix}USERS", "0")),  # pylint: disable=E1101
+            arrival_rate=float(os.environ.get(f"{prefix}ARRIVAL_RATE", "5.0")),  # pylint: disable=E1101
+            ramp_up=float(os.environ.get(f"{prefix}RAMP_UP", "0.0")),  # pylint: disable=E1101
+        )
+
+    def arrival_offset(self, idx: int) -> float:
+        """Seconds from the start of the run when virtual user idx (0-based) starts"""
+        if self.arrival_rate <= 0.0:
+            return 0.0
+        ramp_users = self.arrival_rate * self.ramp_up / 2.0
+        if idx < ramp_users:
+            return math.sqrt(2.0 * self.ramp_up * idx / self.arrival_rate)
+        return self.ramp_up + (idx - ramp_users) / self.arrival_rate
+
+
+@dataclass
+class StepStats:
+    """Latency samples and error count for one step of the flow"""
+
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+
+    def summary(self, wall_time: float) -> Dict[str, Any]:
+        """Percentiles and throughput (successful steps per second of wall time)"""
+        return {
+            "step": self.name,
+            "ok": len(self.latencies),
+            "errors": self.errors,
+            "p50": percentile(self.latencies, 50),
+            "p95": percentile(self.latencies, 95),
+            "p99": percentile(self.latencies, 99),
+            "throughput": len(self.latencies) / wall_time if wall_time > 0.0 else math.nan,
+        }
+
+
+class LoadStats:
+    """Collects per-step timings for all virtual users of one run"""
+
+    def __init__(self) -> None:
+        self.steps: Dict[str, StepStats] = {}
+        self.started = 0.0
+        self.finished = 0.0
+
+    @property
+    def wall_time(self) -> float:
+        """Duration of the run"""
+        return self.finished - self.started
+
+    def _get(self, name: str) -> StepStats:
+        if name not in self.steps:
+            self.steps[name] = StepStats(name)
+        return self.steps[name]
+
+    @asynccontextmanager
+    async def step(self, name: str) -> AsyncIterator[None]:
+        """Time the wrapped block as step name, exceptions count as errors and are re-raised"""
+        stats = self._get(name)
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            stats.errors += 1
+            raise
+        stats.latencies.append(time.perf_counter() - start)
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Summaries for each step in the order they were first seen"""
+        return [stats.summary(self.wall_time) for stats in self.steps.values()]
+
+    def log_report(self) -> None:
+        """Log the report as a table"""
+        LOGGER.info("Load run took {:.2f}s".format(self.wall_time))
+        LOGGER.info(
+            "{:<20} {:>6} {:>6} {:>9} {:>9} {:>9} {:>9}".format("step", "ok", "errors", "p50", "p95", "p99", "req/s")
+        )
+        for row in self.report():
+            LOGGER.info(
+                "{step:<20} {ok:>6} {errors:>6} {p50:>9.3f} {p95:>9.3f} {p99:>9.3f} {throughput:>9.2f}".format(**row)
+            )
+
+
+async def run_load(
+    profile: LoadProfile,
+    user_flow: Callable[[int, LoadStats], Awaitable[None]],
+    stats: Optional[LoadStats] = None,
+) -> LoadStats:
+    """Start user_flow for each virtual user according to the profile and wait for all of them to finish
+
+    Failed flows are logged and counted in the step stats, they do not stop the other users."""
+    if stats is None:
+        stats = LoadStats()
+
+    async def virtual_user(idx: int) -> None:
+        await asyncio.sleep(profile.arrival_offset(idx))
+        try:
+            await user_flow(idx, stats)
+        except Exception as exc:  # pylint: disable=W0703
+            LOGGER.warning("Virtual user {} failed: {!r}".format(idx, exc))
+
+    stats.started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(idx) for idx in range(profile.users)))
+    stats.finished = time.perf_counter()
+    return stats
@@ -0,0 +1,89 @@
+"""In-memory cache of client certificates for mTLS sessions"""
+
+from typing import Dict, Optional, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+import logging
+import os
+import ssl
+import tempfile
+
+from cryptography.hazmat.primitives.serialization import pkcs12
+from cryptography.hazmat.primitives import serialization
+
+LOGGER = logging.getLogger(__name__)
+
+
+@contextmanager
+def anonymous_file(data: bytes) -> Iterator[str]:
+    """Path to an anonymous in-memory file holding data, valid until the context exits
+
+    Uses memfd where available (Linux), elsewhere falls back to a temporary file that is removed right away."""
+    if hasattr(os, "memfd_create"):
+        memfd = os.memfd_create("mtlscred", os.MFD_CLOEXEC)
+        try:
+            os.write(memfd, data)
+            yield f"/proc/self/fd/{memfd}"
+        finally:
+            os.close(memfd)
+        return
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpfile = Path(tmpdir) / "mtlscred.pem"
+        tmpfile.write_bytes(data)
+        yield str(tmpfile)
+
+
+def pfx_to_pem(pfx: bytes, password: Optional[bytes]) -> bytes:
+    """Decode PKCS12 bundle into PEM with unencrypted key followed by the certificate chain"""
+    pfxdata = pkcs12.load_pkcs12(pfx, password)
+    assert pfxdata.key
+    assert pfxdata.cert
+    pem = pfxdata.key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    for cert in [pfxdata.cert, *pfxdata.additional_certs]:
+        pem += cert.certificate.public_bytes(encoding=serialization.Encoding.PEM)
+    return pem
+
+
+class MTLSCredentialCache:
+    """Client SSL contexts keyed by callsign, each PFX is decoded only once and never written to disk"""
+
+    def __init__(self, ca_path: Path) -> None:
+        self.cadata = "".join(
+            cafile.read_text(encoding="utf-8") for cafile in sorted(ca_path.glob("*ca*.pem")) if cafile.is_file()
+        )
+        self._contexts: Dict[str, ssl.SSLContext] = {}
+
+    def __contains__(self, callsign: str) -> bool:
+        return callsign in self._contexts
+
+    def __len__(self) -> int:
+        return len(self._contexts)
+
+    def get(self, callsign: str) -> Optional[ssl.SSLContext]:
+        """Cached context or None"""
+        return self._contexts.get(callsign)
+
+    def add(self, callsign: str, pfx: bytes, password: Optional[bytes] = None) -> ssl.SSLContext:
+        """Get context for callsign, decoding the PFX only if we do not have it yet
+
+        password defaults to the callsign like rasenmaeher uses for enduserpfx"""
+        if callsign in self._contexts:
+            return self._contexts[callsign]
+        if password is None:
+            password = callsign.encode("utf-8")
+        ssl_ctx = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+        if self.cadata:
+            ssl_ctx.load_verify_locations(cadata=self.cadata)
+        with anonymous_file(pfx_to_pem(pfx, password)) as credpath:
+            ssl_ctx.load_cert_chain(credpath)
+        LOGGER.debug("Cached mTLS credentials for {}".format(callsign))
+        self._contexts[callsign] = ssl_ctx
+        return ssl_ctx
+
+    def discard(self, callsign: str) -> None:
+        """Forget the credentials (for example after revocation)"""
+        self._contexts.pop(callsign, None)
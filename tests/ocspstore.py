@@ -0,0 +1,160 @@
+"""Pre-signed OCSP responses keyed by serial so answering a request is a lookup, not a signature"""
+
+from typing import Any, Dict, Optional
+from dataclasses import dataclass
+import datetime
+import logging
+import threading
+import time
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.x509 import ocsp
+
+from .keypool import UserKey
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    """Signed DER response and when it needs to be replaced"""
+
+    der: bytes
+    next_update: datetime.datetime
+
+
+class OCSPStore:  # pylint: disable=too-many-instance-attributes
+    """Signs a response for every known certificate ahead of time
+
+    refresh_due() re-signs responses that would expire within margin, revoke() re-signs the one certificate right away.
+    Responses are valid for validity, so with the defaults each one is re-signed about every 45 minutes.
+    Safe to use from several threads, the signing itself is done outside the lock."""
+
+    def __init__(
+        self,
+        issuer: x509.Certificate,
+        issuer_key: UserKey,
+        validity: datetime.timedelta = datetime.timedelta(hours=1),
+        margin: datetime.timedelta = datetime.timedelta(minutes=15),
+    ) -> None:
+        self.issuer = issuer
+        self.issuer_key = issuer_key
+        self.validity = validity
+        self.margin = margin
+        self.certs: Dict[int, x509.Certificate] = {}
+        self.revoked: Dict[int, datetime.datetime] = {}
+        self.responses: Dict[int, StoredResponse] = {}
+        self.signatures = 0
+        self.lookups = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.responses)
+
+    def _signed(self, cert: x509.Certificate, revoked_at: Optional[datetime.datetime]) -> StoredResponse:
+        """Signed response for cert"""
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        builder = ocsp.OCSPResponseBuilder().add_response(
+            cert=cert,
+            issuer=self.issuer,
+            algorithm=hashes.SHA1(),  # nosec
+            cert_status=ocsp.OCSPCertStatus.REVOKED if revoked_at else ocsp.OCSPCertStatus.GOOD,
+            this_update=now,
+            next_update=now + self.validity,
+            revocation_time=revoked_at,
+            revocation_reason=None,
+        )
+        response = builder.responder_id(ocsp.OCSPResponderEncoding.HASH, self.issuer).sign(
+            self.issuer_key, hashes.SHA256()
+        )
+        return StoredResponse(response.public_bytes(serialization.Encoding.DER), now + self.validity)
+
+    def _store(self, serial: int, stored: StoredResponse, revoked_at: Optional[datetime.datetime]) -> bool:
+        """Keep stored unless the certificate was forgotten or revoked while it was being signed"""
+        with self._lock:
+            if serial not in self.certs or self.revoked.get(serial) != revoked_at:
+                return False
+            self.responses[serial] = stored
+            self.signatures += 1
+            return True
+
+    def sign(self, serial: int) -> None:
+        """(Re-)sign the response for serial"""
+        with self._lock:
+            cert = self.certs[serial]
+            revoked_at = self.revoked.get(serial)
+        self._store(serial, self._signed(cert, revoked_at), revoked_at)
+
+    def add(self, cert: x509.Certificate) -> None:
+        """New certificate, signs its first response"""
+        with self._lock:
+            self.certs[cert.serial_number] = cert
+        self.sign(cert.serial_number)
+
+    def revoke(self, serial: int) -> None:
+        """Mark revoked and replace the stored GOOD response immediately"""
+        with self._lock:
+            if serial not in self.certs or serial in self.revoked:
+                return
+            self.revoked[serial] = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        self.sign(serial)
+
+    def refresh_due(self) -> int:
+        """Re-sign responses expiring within margin and forget expired certificates, returns how many were signed"""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            for serial in [serial for serial, cert in self.certs.items() if cert.not_valid_after_utc < now]:
+                del self.certs[serial]
+                self.responses.pop(serial, None)
+            due = [
+                (serial, self.certs[serial], self.revoked.get(serial))
+                for serial, stored in self.responses.items()
+                if stored.next_update - now < self.margin
+            ]
+        return sum(self._store(serial, self._signed(cert, revoked_at), revoked_at) for serial, cert, revoked_at in due)
+
+    def lookup(self, request_der: bytes) -> bytes:
+        """Stored response for the OCSP request, UNAUTHORIZED for certificates we do not know"""
+        request = ocsp.load_der_ocsp_request(request_der)
+        with self._lock:
+            self.lookups += 1
+            stored = self.responses.get(request.serial_number)
+            if stored is None:
+                self.misses += 1
+        if stored is None:
+            return ocsp.OCSPResponseBuilder.build_unsuccessful(ocsp.OCSPResponseStatus.UNAUTHORIZED).public_bytes(
+                serialization.Encoding.DER
+            )
+        return stored.der
+
+    def metrics(self) -> Dict[str, Any]:
+        """Store size and refresh lag (how far past its refresh point the stalest response is)"""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            responses = list(self.responses.values())
+        headroom = min((stored.next_update - now for stored in responses), default=self.validity)
+        return {
+            "responses": len(responses),
+            "bytes": sum(len(stored.der) for stored in responses),
+            "min_headroom_seconds": headroom.total_seconds(),
+            "refresh_lag_seconds": max(0.0, (self.margin - headroom).total_seconds()),
+            "signatures": self.signatures,
+            "lookups": self.lookups,
+            "misses": self.misses,
+        }
+
+    def log_metrics(self) -> None:
+        """Log the metrics"""
+        LOGGER.info("OCSP store: {}".format(", ".join(f"{key}={value}" for key, value in self.metrics().items())))
+
+
+def timed_refresh(store: OCSPStore) -> float:
+    """Run refresh_due and return the seconds it took"""
+    started = time.perf_counter()
+    signed = store.refresh_due()
+    elapsed = time.perf_counter() - started
+    if signed:
+        LOGGER.debug("Re-signed {} OCSP responses in {:.3f}s".format(signed, elapsed))
+    return elapsed
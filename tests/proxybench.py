@@ -0,0 +1,122 @@
+"""Requests per second through nginx with keep-alive client connections
+
+The client side keeps its connections open so what changes between runs is what nginx does towards the upstream.
+Run against the composition before and after a change with the same --report file and the second run logs the
+difference to the first::
+
+    python -m tests.proxybench --label before --url https://localmaeher.dev.pvarki.fi:4439/api/v1/healthcheck \\
+        --report proxy.json
+    python -m tests.proxybench --label after --url https://localmaeher.dev.pvarki.fi:4439/api/v1/healthcheck \\
+        --report proxy.json
+
+Product APIs need a client certificate, pass --pfx USER.pfx --callsign USER. Where nginx caches the url the report
+counts the X-Cache-Status values (HIT, MISS, ...) too.
+"""
+
+from typing import Any, Dict, List
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import aiohttp
+from libadvian.logging import init_logging
+
+from .benchcli import add_pfx_arguments, add_report_argument, log_results, parse_args, pfx_context, write_report
+from .clientpool import ClientFactory
+from .conftest import CA_PATH
+from .loadgen import percentile
+
+LOGGER = logging.getLogger(__name__)
+
+
+async def bench_url(session: aiohttp.ClientSession, url: str, concurrency: int, duration: float) -> Dict[str, Any]:
+    """GET url from concurrency workers for duration seconds"""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    cache: Dict[str, int] = {}
+    deadline = time.perf_counter() + duration
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            async with session.get(url) as resp:
+                await resp.read()
+                statuses[resp.status] = statuses.get(resp.status, 0) + 1
+                if "X-Cache-Status" in resp.headers:
+                    cache[resp.headers["X-Cache-Status"]] = cache.get(resp.headers["X-Cache-Status"], 0) + 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_time = time.perf_counter() - started
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "cache": cache,  # X-Cache-Status counts (HIT, MISS, ...) where nginx caches the url
+        "requests_per_second": len(latencies) / wall_time,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+async def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Warm up the client pool, then benchmark each url"""
+    factory = ClientFactory(CA_PATH, limit=args.concurrency, limit_per_host=args.concurrency)
+    ssl_ctx = pfx_context(args, factory.credentials)
+    results = []
+    try:
+        async with factory.session(ssl_ctx) as session:
+            for url in args.url:
+                await bench_url(session, url, args.concurrency, min(1.0, args.duration))
+                results.append({"label": args.label, **await bench_url(session, url, args.concurrency, args.duration)})
+    finally:
+        await factory.close()
+    return results
+
+
+def compare(results: List[Dict[str, Any]], previous: List[Dict[str, Any]]) -> None:
+    """Log throughput change against the first earlier run of the same url"""
+    for row in results:
+        earlier = next((old for old in previous if old["url"] == row["url"]), None)
+        if not earlier:
+            continue
+        LOGGER.info(
+            "{}: {:.1f} req/s ({}) vs {:.1f} req/s ({}), {:+.1f}%".format(
+                row["url"],
+                row["requests_per_second"],
+                row["label"],
+                earlier["requests_per_second"],
+                earlier["label"],
+                (row["requests_per_second"] / earlier["requests_per_second"] - 1.0) * 100.0,
+            )
+        )
+
+
+def main() -> None:
+    """Run the benchmark from command line"""
+    parser = argparse.ArgumentParser(description="Throughput of proxied requests over keep-alive connections")
+    parser.add_argument("--url", action="append", required=True, help="URL to GET, can be given multiple times")
+    parser.add_argument("--concurrency", type=int, default=20, help="Parallel requests (and client connections)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per url")
+    add_pfx_arguments(parser, "for mTLS urls")
+    parser.add_argument("--label", default="run", help="Name of this run in the report, e.g. before/after")
+    add_report_argument(parser, "Append results as JSON here and compare to earlier runs")
+    args = parse_args(parser)
+    init_logging(logging.INFO)
+    results = asyncio.run(run(args))
+    log_results(LOGGER, results, precision=4)
+    if args.report:
+        previous: List[Dict[str, Any]] = []
+        if args.report.exists():
+            previous = json.loads(args.report.read_text(encoding="utf-8"))
+        compare(results, previous)
+        write_report(args.report, previous + results)
+
+
+if __name__ == "__main__":
+    main()
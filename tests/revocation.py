@@ -0,0 +1,254 @@
+"""Measure how long a revocation takes to reach each layer that should enforce it"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+import asyncio
+import functools
+import logging
+import ssl
+import time
+
+import aiohttp
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.serialization import pkcs12
+from cryptography.x509 import ocsp
+
+from .clientpool import ClientFactory
+from .loadgen import percentile
+from .waiting import ConditionTimings, wait_until
+
+LOGGER = logging.getLogger(__name__)
+DEFAULT_LAYERS = ("api", "crl", "ocsp", "mtls", "products")
+# nginx answers a failed client certificate verification with 400 (or drops the handshake)
+MTLS_REJECT_STATUSES = (400, 495, 496)
+# ...unless the vhost sends it to the UI error page instead, like the rasenmaeher mtls. host does
+MTLS_ERROR_PATH = "/error"
+
+
+def is_mtls_rejection(status: Optional[int], location: str = "") -> bool:
+    """Failed handshake, an error status or a redirect to the error page all mean the cert was refused"""
+    if status is None or status in MTLS_REJECT_STATUSES:
+        return True
+    return 300 <= status < 400 and urlsplit(location).path == MTLS_ERROR_PATH
+
+
+def load_crl(data: bytes) -> x509.CertificateRevocationList:
+    """Parse CRL in either DER or PEM"""
+    if data.lstrip().startswith(b"-----BEGIN"):
+        return x509.load_pem_x509_crl(data)
+    return x509.load_der_x509_crl(data)
+
+
+def crl_number(crl: x509.CertificateRevocationList) -> Optional[int]:
+    """CRLNumber extension value if there is one"""
+    try:
+        return int(crl.extensions.get_extension_for_class(x509.CRLNumber).value.crl_number)
+    except x509.ExtensionNotFound:
+        return None
+
+
+def delta_base_number(crl: x509.CertificateRevocationList) -> Optional[int]:
+    """Number of the base CRL this delta CRL applies to, None for complete CRLs"""
+    try:
+        return int(crl.extensions.get_extension_for_class(x509.DeltaCRLIndicator).value.crl_number)
+    except x509.ExtensionNotFound:
+        return None
+
+
+def delta_applies(base: x509.CertificateRevocationList, delta: x509.CertificateRevocationList) -> bool:
+    """delta is a delta CRL for base (or a newer base of the same issuer, RFC 5280 5.2.4)"""
+    base_number, delta_of = crl_number(base), delta_base_number(delta)
+    return delta.issuer == base.issuer and base_number is not None and delta_of is not None and base_number >= delta_of
+
+
+def ocsp_request_der(cert: x509.Certificate, issuer: x509.Certificate) -> bytes:
+    """DER encoded OCSP request for cert"""
+    builder = ocsp.OCSPRequestBuilder().add_certificate(cert, issuer, hashes.SHA1())  # nosec
+    return builder.build().public_bytes(serialization.Encoding.DER)
+
+
+@dataclass(frozen=True)
+class RevokedSubject:
+    """Everything the probe needs to know about the credentials being revoked"""
+
+    callsign: str
+    jwt: str
+    cert: x509.Certificate
+    issuer: x509.Certificate
+    ssl_ctx: ssl.SSLContext
+
+    @classmethod
+    def from_pfx(cls, callsign: str, jwt: str, pfx: bytes, ssl_ctx: ssl.SSLContext) -> "RevokedSubject":
+        """Pick the cert and its issuer from the PFX"""
+        pfxdata = pkcs12.load_pkcs12(pfx, callsign.encode("utf-8"))
+        assert pfxdata.cert
+        cert = pfxdata.cert.certificate
+        issuers = [extra.certificate for extra in pfxdata.additional_certs if extra.certificate.subject == cert.issuer]
+        assert issuers, f"No issuer for {callsign} in the PFX"
+        return cls(callsign, jwt, cert, issuers[0], ssl_ctx)
+
+
+class RevocationProbe:
+    """Polls each layer after a revocation until it reflects it
+
+    Layers are: the API itself (JWT rejected), CRL content, OCSP responder status, nginx mTLS rejection on the
+    mtls. host and each product API. The mTLS checks always do a full handshake on a fresh connection,
+    a resumed TLS session would skip the revocation check."""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        client_factory: ClientFactory,
+        api: str,
+        mtls_api: str,
+        *,
+        products: Sequence[str] = ("tak", "fake"),
+        layers: Sequence[str] = DEFAULT_LAYERS,
+        deadline: float = 120.0,
+        timings: Optional[ConditionTimings] = None,
+    ) -> None:
+        self.client_factory = client_factory
+        self.api = api
+        self.mtls_api = mtls_api
+        self.products = products
+        self.layers = layers
+        self.deadline = deadline
+        self.timings = timings if timings is not None else ConditionTimings()
+
+    @property
+    def ocsp_url(self) -> str:
+        """The /ca/ocsp responder on the rasenmaeher host"""
+        return self.api.rsplit("/api", 1)[0] + "/ca/ocsp"
+
+    def product_url(self, product: str) -> str:
+        """Product integration API healthcheck"""
+        return self.mtls_api.replace(":4439/api", ":4626/").replace("mtls.", f"{product}.") + "api/v1/healthcheck"
+
+    async def fresh_response(self, ssl_ctx: ssl.SSLContext, url: str) -> Tuple[Optional[int], str]:
+        """GET url on a brand new connection, status and Location, None status if the connection/handshake failed"""
+        connector = aiohttp.TCPConnector(ssl=ssl_ctx, force_close=True)
+        try:
+            async with aiohttp.ClientSession(connector=connector) as session:
+                async with session.get(url, allow_redirects=False) as resp:
+                    return resp.status, resp.headers.get("Location", "")
+        except aiohttp.ClientError as exc:
+            LOGGER.debug("Got {!r} from {}".format(exc, url))
+            return None, ""
+
+    async def api_rejects(self, subject: RevokedSubject) -> bool:
+        """API no longer accepts the users JWT"""
+        async with self.client_factory.session(headers={"Authorization": f"Bearer {subject.jwt}"}) as client:
+            async with client.get(f"{self.api}/v1/instructions/user") as resp:
+                return resp.status == 403
+
+    async def crl_lists(self, subject: RevokedSubject) -> bool:
+        """Serial is in the CRL served by the API, or in the delta CRL for it if the API publishes one"""
+        serial = subject.cert.serial_number
+        async with self.client_factory.session() as client:
+            async with client.get(f"{self.api}/v1/utils/crl") as resp:
+                if resp.status != 200:
+                    return False
+                base = load_crl(await resp.read())
+            if base.get_revoked_certificate_by_serial_number(serial) is not None:
+                return True
+            async with client.get(f"{self.api}/v1/utils/crl/delta") as resp:
+                if resp.status != 200:
+                    return False
+                try:
+                    delta = load_crl(await resp.read())
+                except ValueError:
+                    LOGGER.debug("{}/v1/utils/crl/delta is not a CRL".format(self.api))
+                    return False
+        return delta_applies(base, delta) and delta.get_revoked_certificate_by_serial_number(serial) is not None
+
+    async def ocsp_revoked(self, subject: RevokedSubject) -> bool:
+        """OCSP responder says REVOKED"""
+        async with self.client_factory.session() as client:
+            async with client.post(
+                self.ocsp_url,
+                data=ocsp_request_der(subject.cert, subject.issuer),
+                headers={"Content-Type": "application/ocsp-request"},
+            ) as resp:
+                if resp.status != 200:
+                    return False
+                ocspresp = ocsp.load_der_ocsp_response(await resp.read())
+        if ocspresp.response_status != ocsp.OCSPResponseStatus.SUCCESSFUL:
+            return False
+        return bool(ocspresp.certificate_status == ocsp.OCSPCertStatus.REVOKED)
+
+    async def mtls_rejects(self, subject: RevokedSubject) -> bool:
+        """nginx refuses the client certificate on the mtls. host"""
+        status, location = await self.fresh_response(subject.ssl_ctx, f"{self.mtls_api}/v1/instructions/user")
+        return is_mtls_rejection(status, location)
+
+    async def product_rejects(self, subject: RevokedSubject, product: str) -> bool:
+        """Product API no longer serves the user"""
+        status, _ = await self.fresh_response(subject.ssl_ctx, self.product_url(product))
+        return status != 200
+
+    async def product_accepts(self, subject: RevokedSubject, product: str) -> bool:
+        """Product API serves the user (baseline before revoking)"""
+        return not await self.product_rejects(subject, product)
+
+    def conditions(self, subject: RevokedSubject) -> Dict[str, Callable[[], Awaitable[bool]]]:
+        """Named conditions to poll for the enabled layers"""
+        conditions: Dict[str, Callable[[], Awaitable[bool]]] = {}
+        if "api" in self.layers:
+            conditions["api"] = lambda: self.api_rejects(subject)
+        if "crl" in self.layers:
+            conditions["crl"] = lambda: self.crl_lists(subject)
+        if "ocsp" in self.layers:
+            conditions["ocsp"] = lambda: self.ocsp_revoked(subject)
+        if "mtls" in self.layers:
+            conditions["mtls"] = lambda: self.mtls_rejects(subject)
+        if "products" in self.layers:
+            for product in self.products:
+                conditions[f"product_{product}"] = functools.partial(self.product_rejects, subject, product)
+        return conditions
+
+    async def wait_baseline(self, subject: RevokedSubject) -> None:
+        """Make sure the products know the user before we revoke, otherwise we would measure provisioning"""
+        if "products" not in self.layers:
+            return
+        await asyncio.gather(
+            *(
+                wait_until(
+                    functools.partial(self.product_accepts, subject, product),
+                    name=f"{product}_sees_new_user",
+                    deadline=self.deadline,
+                )
+                for product in self.products
+            )
+        )
+
+    async def measure(self, subject: RevokedSubject, revoke: Callable[[], Awaitable[None]]) -> Dict[str, float]:
+        """Call revoke and return the seconds from its return until each layer reflected the revocation"""
+        conditions = self.conditions(subject)
+        await revoke()
+        stamp = time.perf_counter()
+        LOGGER.debug("Revoked {} (serial {})".format(subject.callsign, subject.cert.serial_number))
+
+        async def propagated(name: str, condition: Callable[[], Awaitable[bool]]) -> float:
+            """Wait for one layer"""
+            await wait_until(condition, name=f"revocation_{name}", deadline=self.deadline)
+            elapsed = time.perf_counter() - stamp
+            self.timings.record(name, elapsed)
+            return elapsed
+
+        results = await asyncio.gather(*(propagated(name, cond) for name, cond in conditions.items()))
+        return dict(zip(conditions.keys(), results))
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Per layer propagation time distribution"""
+        return [
+            {
+                "layer": name,
+                "n": len(samples),
+                "p50": percentile(samples, 50),
+                "p95": percentile(samples, 95),
+                "p99": percentile(samples, 99),
+                "max": max(samples),
+            }
+            for name, samples in self.timings.samples.items()
+        ]
@@ -0,0 +1,582 @@
+"""Offline stand-in for the parts of rasenmaeher-api the integration tests use
+
+Meant for benchmarking and profiling the client side of the harness without the full composition::
+
+    python -m tests.stubapi --port 8000 --latency 0.05 --error-rate 0.01
+    RM_API_BASE=http://127.0.0.1:8000/api py.test -v tests/
+
+The stub speaks plain HTTP so there are no client certificates, requests to admin endpoints without
+an Authorization header are treated as coming from an mTLS authenticated admin.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from email.utils import format_datetime
+import argparse
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import random
+import secrets
+
+from aiohttp import web
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.serialization import pkcs12
+from libadvian.logging import init_logging
+from multikeyjwt import Issuer, Verifier
+
+from .keypool import DER_GENERATORS, KeyPool, UserKey, generate_key
+from .mtlscreds import anonymous_file
+from .ocspstore import OCSPStore, timed_refresh
+
+LOGGER = logging.getLogger(__name__)
+CRL_VALIDITY = datetime.timedelta(hours=1)
+JWT_PATH = Path(__file__).parent / "testjwts"
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+ERROR_CLASSES: Dict[int, type[web.HTTPException]] = {
+    400: web.HTTPBadRequest,
+    403: web.HTTPForbidden,
+    404: web.HTTPNotFound,
+}
+
+
+def fastapi_error(status: int, detail: str) -> web.HTTPException:
+    """FastAPI style {"detail": ...} error to raise from handlers"""
+    return ERROR_CLASSES[status](text=json.dumps({"detail": detail}), content_type="application/json")
+
+
+def format_http_date(stamp: datetime.datetime) -> str:
+    """RFC 9110 IMF-fixdate"""
+    return format_datetime(stamp.astimezone(datetime.timezone.utc), usegmt=True)
+
+
+def load_jwt_keys(keyfile: Path) -> tuple[Issuer, Verifier]:
+    """Issuer and matching verifier for the given private key (miniwerk.key by default)"""
+    issuer = Issuer(privkeypath=keyfile, keypasswd=None)
+    privkey = serialization.load_pem_private_key(keyfile.read_bytes(), password=None)
+    pubpem = privkey.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM, format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    with anonymous_file(pubpem) as pubpath:
+        verifier = Verifier(pubkeypath=Path(pubpath))
+    return issuer, verifier
+
+
+@dataclass
+class StubConfig:  # pylint: disable=too-many-instance-attributes
+    """Knobs for making the stub behave like a loaded server"""
+
+    latency: float = 0.0  # seconds added to every response
+    latency_jitter: float = 0.0  # +- seconds of uniform random variation on latency
+    error_rate: float = 0.0  # fraction of requests answered with 503
+    padding: int = 0  # bytes of filler added to every JSON response
+    keysize: int = 2048  # RSA key size for the enduserpfx bundles
+    keytype: str = "rsa"  # "rsa" or "ecdsa" (P-256) for the CA and the enduserpfx bundles
+    key_pool: int = 0  # pre-generated keys to keep ready for enduserpfx, 0 generates each key on request
+    ocsp_refresh: float = 60.0  # seconds between checks for OCSP responses to re-sign
+    crl_delta_limit: int = 0  # revocations to collect in the delta CRL before re-signing the base CRL
+
+
+@dataclass(frozen=True)
+class SignedCRL:
+    """DER encoded CRL with the values its HTTP validators and cache headers are derived from"""
+
+    der: bytes
+    etag: str  # sha256 of the DER, strong validator
+    last_update: datetime.datetime
+    next_update: datetime.datetime
+
+    def not_modified(self, request: web.Request) -> bool:
+        """Does the request already have this CRL (If-None-Match takes precedence over If-Modified-Since)"""
+        if request.if_none_match is not None:
+            return any(tag.value in (self.etag, "*") and not tag.is_weak for tag in request.if_none_match)
+        if request.if_modified_since is not None:
+            return self.last_update <= request.if_modified_since
+        return False
+
+    def headers(self) -> Dict[str, str]:
+        """Validators and cache headers, clients may use it until nextUpdate"""
+        max_age = max(0, int((self.next_update - datetime.datetime.now(datetime.timezone.utc)).total_seconds()))
+        return {
+            "ETag": f'"{self.etag}"',
+            "Last-Modified": format_http_date(self.last_update),
+            "Expires": format_http_date(self.next_update),
+            "Cache-Control": f"public, max-age={max_age}, must-revalidate",
+        }
+
+
+class StubCA:  # pylint: disable=too-many-instance-attributes
+    """Throwaway CA for issuing PFX bundles and the CRL
+
+    With delta_limit > 0 new revocations go to a delta CRL until there are more than delta_limit of them, only then
+    is the (large) base CRL re-signed. With the default 0 every revocation re-signs the base CRL."""
+
+    def __init__(self, keysize: int = 2048, keytype: str = "rsa", delta_limit: int = 0) -> None:
+        self.keysize = keysize
+        self.delta_limit = delta_limit
+        self.keytype = keytype
+        self.key = generate_key(keytype, keysize)
+        self.name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "rasenmaeher stub CA")])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        self.cert = (
+            x509.CertificateBuilder()
+            .subject_name(self.name)
+            .issuer_name(self.name)
+            .public_key(self.key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=30))
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+            .sign(self.key, hashes.SHA256())
+        )
+        self.revoked: Dict[int, datetime.datetime] = {}
+        self.crl_number = 0
+        self._base_number = 0
+        self._base_serials: frozenset[int] = frozenset()
+        self._crl: Optional[SignedCRL] = None
+        self._delta: Optional[SignedCRL] = None
+        self.ocsp = OCSPStore(self.cert, self.key)
+
+    def issue_cert(self, common_name: str, key: UserKey, dns_names: Sequence[str] = ()) -> x509.Certificate:
+        """Sign a week long certificate for key"""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        builder = (
+            x509.CertificateBuilder()
+            .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)]))
+            .issuer_name(self.name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=7))
+        )
+        if dns_names:
+            builder = builder.add_extension(
+                x509.SubjectAlternativeName([x509.DNSName(name) for name in dns_names]), critical=False
+            )
+        return builder.sign(self.key, hashes.SHA256())
+
+    def issue_pfx(self, callsign: str, key: Optional[UserKey] = None) -> tuple[int, bytes]:
+        """Certificate for callsign (new key unless given) as PKCS12 protected by the callsign, returns (serial, pfx)"""
+        if key is None:
+            key = generate_key(self.keytype, self.keysize)
+        cert = self.issue_cert(callsign, key)
+        self.ocsp.add(cert)
+        pfx = pkcs12.serialize_key_and_certificates(
+            callsign.encode("utf-8"),
+            key,
+            cert,
+            [self.cert],
+            serialization.BestAvailableEncryption(callsign.encode("utf-8")),
+        )
+        return cert.serial_number, pfx
+
+    def revoke(self, serial: int) -> None:
+        """Add serial to the CRL, or to the delta CRL while it stays within delta_limit entries"""
+        if serial not in self.revoked:
+            self.revoked[serial] = datetime.datetime.now(datetime.timezone.utc)
+            self._delta = None
+            if len(self.revoked) - len(self._base_serials) > self.delta_limit:
+                self._crl = None
+            self.ocsp.revoke(serial)
+
+    def prefill(self, count: int) -> None:
+        """Revoke count made up serials, for growing the CRL"""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for _ in range(count):
+            self.revoked[x509.random_serial_number()] = now
+        self._crl = None
+
+    def _sign_crl(self, serials: Iterable[int], delta_of: Optional[int] = None) -> SignedCRL:
+        """Sign the next numbered CRL listing serials, a delta CRL if delta_of is the base CRLs number"""
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        self.crl_number += 1
+        builder = (
+            x509.CertificateRevocationListBuilder()
+            .issuer_name(self.name)
+            .last_update(now)
+            .next_update(now + CRL_VALIDITY)
+            .add_extension(x509.CRLNumber(self.crl_number), critical=False)
+        )
+        if delta_of is not None:
+            builder = builder.add_extension(x509.DeltaCRLIndicator(delta_of), critical=True)
+        for serial in serials:
+            builder = builder.add_revoked_certificate(
+                x509.RevokedCertificateBuilder().serial_number(serial).revocation_date(self.revoked[serial]).build()
+            )
+        der = builder.sign(self.key, hashes.SHA256()).public_bytes(serialization.Encoding.DER)
+        return SignedCRL(der, hashlib.sha256(der).hexdigest(), now, now + CRL_VALIDITY)
+
+    def crl(self) -> SignedCRL:
+        """Current base CRL, re-signed when half of its validity has passed or the delta outgrew delta_limit"""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if self._crl is None or now >= self._crl.last_update + CRL_VALIDITY / 2:
+            self._base_serials = frozenset(self.revoked)
+            self._crl = self._sign_crl(self._base_serials)
+            self._base_number = self.crl_number
+            self._delta = None
+        return self._crl
+
+    def delta_crl(self) -> SignedCRL:
+        """Revocations since the current base CRL"""
+        self.crl()
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if self._delta is None or now >= self._delta.last_update + CRL_VALIDITY / 2:
+            pending = [serial for serial in self.revoked if serial not in self._base_serials]
+            self._delta = self._sign_crl(pending, delta_of=self._base_number)
+        return self._delta
+
+
+@dataclass
+class StubUser:
+    """Enrolled (or admin) user"""
+
+    callsign: str
+    approvecode: str = field(default_factory=lambda: secrets.token_urlsafe(8))
+    accepted: bool = False
+    admin: bool = False
+    serial: Optional[int] = None
+    revoked: bool = False
+
+
+def openapi_spec() -> Dict[str, Any]:
+    """Minimal spec with the bits test_openapi checks for"""
+    return {
+        "openapi": "3.1.0",
+        "info": {"title": "FastAPI", "version": "stub"},
+        "paths": {"/api/v1/healthcheck": {"get": {}}},
+        "components": {
+            "schemas": {"CertificatesRequest": {"type": "object"}},
+            "securitySchemes": {"JWTBearer": {"type": "http", "scheme": "bearer"}},
+        },
+    }
+
+
+class StubAPI:  # pylint: disable=too-many-public-methods,too-many-instance-attributes
+    """In-memory implementation of the rasenmaeher-api endpoints"""
+
+    def __init__(self, issuer: Issuer, verifier: Verifier, config: Optional[StubConfig] = None) -> None:
+        self.issuer = issuer
+        self.verifier = verifier
+        self.config = config or StubConfig()
+        self.ca = StubCA(self.config.keysize, self.config.keytype, self.config.crl_delta_limit)
+        self.key_pool = KeyPool(
+            self.config.key_pool, generate=DER_GENERATORS[self.config.keytype], keysize=self.config.keysize
+        )
+        self.codes: Dict[str, Dict[str, Any]] = {}
+        self.used_codes: set[str] = set()
+        self.invitecodes: Dict[str, bool] = {}
+        self.users: Dict[str, StubUser] = {}
+        self._refresher: Optional["asyncio.Task[None]"] = None
+
+    # Helpers
+
+    def respond(self, payload: Dict[str, Any], status: int = 200) -> web.Response:
+        """JSON response with the configured padding"""
+        if self.config.padding:
+            payload = {**payload, "padding": "x" * self.config.padding}
+        return web.json_response(payload, status=status)
+
+    def claims(self, request: web.Request) -> Optional[Dict[str, Any]]:
+        """Decoded bearer token or None if there is no Authorization header"""
+        auth = request.headers.get("Authorization")
+        if not auth:
+            return None
+        if not auth.startswith("Bearer "):
+            raise fastapi_error(403, "Forbidden")
+        try:
+            return self.verifier.decode(auth[len("Bearer ") :])
+        except Exception as exc:  # pylint: disable=W0703
+            LOGGER.debug("Invalid JWT: {!r}".format(exc))
+            raise fastapi_error(403, "Forbidden") from exc
+
+    def require_admin(self, request: web.Request) -> None:
+        """No auth header means mTLS stand-in, otherwise the JWT sub must be an admin"""
+        claims = self.claims(request)
+        if claims is None:
+            return
+        user = self.users.get(claims.get("sub", ""))
+        if not user or not user.admin or user.revoked:
+            raise fastapi_error(403, "Forbidden")
+
+    def require_user(self, request: web.Request) -> StubUser:
+        """User the JWT belongs to"""
+        claims = self.claims(request)
+        if claims is None or claims.get("sub") not in self.users:
+            raise fastapi_error(403, "Forbidden")
+        user = self.users[claims["sub"]]
+        if user.revoked:
+            raise fastapi_error(403, "Forbidden")
+        return user
+
+    def new_code(self, claims: Dict[str, Any]) -> str:
+        """Single use code that can be exchanged for JWT with given claims"""
+        code = secrets.token_urlsafe(12)
+        self.codes[code] = claims
+        return code
+
+    # Middleware
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler: Handler) -> web.StreamResponse:
+        """Inject latency and errors"""
+        delay = self.config.latency + random.uniform(-self.config.latency_jitter, self.config.latency_jitter)
+        if delay > 0.0:
+            await asyncio.sleep(delay)
+        if self.config.error_rate and random.random() < self.config.error_rate:
+            return web.json_response({"detail": "Injected error"}, status=503)
+        return await handler(request)
+
+    # Handlers
+
+    async def healthcheck(self, _request: web.Request) -> web.Response:
+        """GET /api/v1/healthcheck"""
+        return self.respond({"healthy": True, "extra": None})
+
+    async def openapi(self, _request: web.Request) -> web.Response:
+        """GET /api/openapi.json"""
+        return self.respond(openapi_spec())
+
+    async def code_generate(self, request: web.Request) -> web.Response:
+        """POST /api/v1/token/code/generate"""
+        claims = self.claims(request)
+        if not claims or not claims.get("anon_admin_session"):
+            raise fastapi_error(403, "Forbidden")
+        body = await request.json()
+        return self.respond({"code": self.new_code(dict(body.get("claims", {})))})
+
+    async def code_exchange(self, request: web.Request) -> web.Response:
+        """POST /api/v1/token/code/exchange"""
+        code = (await request.json()).get("code", "")
+        if code not in self.codes or code in self.used_codes:
+            raise fastapi_error(403, "Forbidden")
+        self.used_codes.add(code)
+        claims = {"nonce": secrets.token_hex(8), **self.codes[code]}
+        claims.setdefault("sub", "anon_admin")
+        return self.respond({"jwt": self.issuer.issue(claims)})
+
+    async def firstuser_check_code(self, request: web.Request) -> web.Response:
+        """GET /api/v1/firstuser/check-code"""
+        code = request.query.get("temp_admin_code", "")
+        if code in self.used_codes:
+            raise fastapi_error(403, "Code already used")
+        if code not in self.codes:
+            raise fastapi_error(404, "Not found")
+        return self.respond({"code_ok": True})
+
+    async def firstuser_add_admin(self, request: web.Request) -> web.Response:
+        """POST /api/v1/firstuser/add-admin"""
+        claims = self.claims(request)
+        if not claims or not claims.get("anon_admin_session"):
+            raise fastapi_error(403, "Forbidden")
+        callsign = (await request.json())["callsign"]
+        if callsign in self.users:
+            raise fastapi_error(403, "Forbidden")
+        self.users[callsign] = StubUser(callsign, accepted=True, admin=True)
+        return self.respond({"admin_added": True, "jwt_exchange_code": self.new_code({"sub": callsign})})
+
+    async def invitecode_create(self, request: web.Request) -> web.Response:
+        """POST /api/v1/enrollment/invitecode/create"""
+        self.require_admin(request)
+        code = secrets.token_urlsafe(8)
+        self.invitecodes[code] = True
+        return self.respond({"invite_code": code})
+
+    async def invitecode_check(self, request: web.Request) -> web.Response:
+        """GET /api/v1/enrollment/invitecode"""
+        return self.respond({"invitecode_is_active": self.invitecodes.get(request.query.get("invitecode", ""), False)})
+
+    async def invitecode_enroll(self, request: web.Request) -> web.Response:
+        """POST /api/v1/enrollment/invitecode/enroll"""
+        body = await request.json()
+        if "invite_code" not in body:
+            return self.respond(
+                {"detail": [{"loc": ["body", "invite_code"], "msg": "field required", "type": "value_error.missing"}]},
+                status=422,
+            )
+        if not self.invitecodes.get(body["invite_code"], False):
+            raise fastapi_error(404, "Not found")
+        callsign = body["callsign"]
+        if callsign in self.users:
+            raise fastapi_error(400, "Error. callsign/callsign already taken.")
+        user = StubUser(callsign)
+        self.users[callsign] = user
+        return self.respond(
+            {"callsign": callsign, "jwt": self.issuer.issue({"sub": callsign}), "approvecode": user.approvecode}
+        )
+
+    async def enrollment_list(self, request: web.Request) -> web.Response:
+        """GET /api/v1/enrollment/list"""
+        self.require_admin(request)
+        return self.respond(
+            {
+                "callsign_list": [
+                    {"callsign": user.callsign, "approvecode": "", "state": int(user.accepted)}
+                    for user in self.users.values()
+                    if not user.revoked
+                ]
+            }
+        )
+
+    async def enrollment_pools(self, request: web.Request) -> web.Response:
+        """GET /api/v1/enrollment/pools"""
+        self.require_admin(request)
+        return self.respond(
+            {"pools": [{"invitecode": code, "active": active} for code, active in self.invitecodes.items()]}
+        )
+
+    async def have_i_been_accepted(self, request: web.Request) -> web.Response:
+        """GET /api/v1/enrollment/have-i-been-accepted"""
+        claims = self.claims(request)
+        user = self.users.get((claims or {}).get("sub", ""))
+        if not user:
+            raise fastapi_error(403, "Forbidden")
+        return self.respond({"have_i_been_accepted": user.accepted})
+
+    async def enrollment_accept(self, request: web.Request) -> web.Response:
+        """POST /api/v1/enrollment/accept"""
+        self.require_admin(request)
+        body = await request.json()
+        user = self.users.get(body.get("callsign", ""))
+        if not user or user.approvecode != body.get("approvecode"):
+            raise fastapi_error(404, "Not found")
+        user.accepted = True
+        return self.respond({"callsign": user.callsign, "approvecode": user.approvecode, "success": True})
+
+    async def enduserpfx(self, request: web.Request) -> web.Response:
+        """GET /api/v1/enduserpfx/{name}"""
+        user = self.require_user(request)
+        callsign = request.match_info["name"].removesuffix(".pfx")
+        if callsign != user.callsign or not user.accepted:
+            raise fastapi_error(403, "Forbidden")
+        serial, pfx = await asyncio.get_running_loop().run_in_executor(
+            None, self.ca.issue_pfx, callsign, self.key_pool.take()
+        )
+        user.serial = serial
+        return web.Response(body=pfx, content_type="application/x-pkcs12")
+
+    async def people_delete(self, request: web.Request) -> web.Response:
+        """DELETE /api/v1/people/{callsign}"""
+        self.require_admin(request)
+        user = self.users.get(request.match_info["callsign"])
+        if not user or user.revoked:
+            raise fastapi_error(404, "Not found")
+        user.revoked = True
+        if user.serial is not None:
+            self.ca.revoke(user.serial)
+        return self.respond({"success": True})
+
+    async def crl(self, request: web.Request) -> web.Response:
+        """GET /api/v1/utils/crl (base) and /api/v1/utils/crl/delta, 304 to conditional requests for the current one"""
+        crl = self.ca.delta_crl() if request.path.endswith("/delta") else self.ca.crl()
+        if crl.not_modified(request):
+            return web.Response(status=304, headers=crl.headers())
+        return web.Response(body=crl.der, content_type="application/pkix-crl", headers=crl.headers())
+
+    async def ocsp_responder(self, request: web.Request) -> web.Response:
+        """POST /ca/ocsp, answered from the pre-signed store"""
+        return web.Response(body=self.ca.ocsp.lookup(await request.read()), content_type="application/ocsp-response")
+
+    async def ocsp_refresher(self) -> None:
+        """Re-sign OCSP responses ahead of expiry"""
+        while True:
+            await asyncio.sleep(self.config.ocsp_refresh)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, timed_refresh, self.ca.ocsp)
+            except Exception:  # pylint: disable=W0703
+                # Nothing awaits this task until cleanup, keep refreshing rather than let the responses expire
+                LOGGER.exception("OCSP refresh failed")
+
+    async def start_background(self, _app: web.Application) -> None:
+        """on_startup hook"""
+        self._refresher = asyncio.create_task(self.ocsp_refresher())
+
+    async def stop_background(self, _app: web.Application) -> None:
+        """on_cleanup hook"""
+        if self._refresher:
+            self._refresher.cancel()
+        self.ca.ocsp.log_metrics()
+
+    async def validuser_admin(self, request: web.Request) -> web.Response:
+        """GET /api/v1/check-auth/validuser/admin"""
+        self.require_admin(request)
+        return self.respond({"type": "jwt" if "Authorization" in request.headers else "mtls"})
+
+    async def instructions_user(self, request: web.Request) -> web.Response:
+        """GET /api/v1/instructions/user"""
+        user = self.require_user(request)
+        return self.respond({"callsign": user.callsign, "instructions": []})
+
+    def create_app(self) -> web.Application:
+        """aiohttp application with all the routes"""
+        app = web.Application(middlewares=[self.middleware])
+        app.on_startup.extend([self.key_pool.start, self.start_background])
+        app.on_cleanup.extend([self.key_pool.close, self.stop_background])
+        app.add_routes(
+            [
+                web.get("/api/openapi.json", self.openapi),
+                web.get("/api/v1/healthcheck", self.healthcheck),
+                web.post("/api/v1/token/code/generate", self.code_generate),
+                web.post("/api/v1/token/code/exchange", self.code_exchange),
+                web.get("/api/v1/firstuser/check-code", self.firstuser_check_code),
+                web.post("/api/v1/firstuser/add-admin", self.firstuser_add_admin),
+                web.post("/api/v1/enrollment/invitecode/create", self.invitecode_create),
+                web.get("/api/v1/enrollment/invitecode", self.invitecode_check),
+                web.post("/api/v1/enrollment/invitecode/enroll", self.invitecode_enroll),
+                web.get("/api/v1/enrollment/list", self.enrollment_list),
+                web.get("/api/v1/enrollment/pools", self.enrollment_pools),
+                web.get("/api/v1/enrollment/have-i-been-accepted", self.have_i_been_accepted),
+                web.post("/api/v1/enrollment/accept", self.enrollment_accept),
+                web.get("/api/v1/enduserpfx/{name}", self.enduserpfx),
+                web.delete("/api/v1/people/{callsign}", self.people_delete),
+                web.get("/api/v1/utils/crl", self.crl),
+                web.get("/api/v1/utils/crl/", self.crl),
+                web.get("/api/v1/utils/crl/delta", self.crl),
+                web.get("/api/v1/check-auth/validuser/admin", self.validuser_admin),
+                web.post("/ca/ocsp", self.ocsp_responder),
+                web.post("/ca/ocsp/", self.ocsp_responder),
+                web.get("/api/v1/instructions/user", self.instructions_user),
+            ]
+        )
+        return app
+
+
+def main() -> None:
+    """Run the stub from command line"""
+    parser = argparse.ArgumentParser(description="Offline stand-in for rasenmaeher-api")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--keyfile", type=Path, default=JWT_PATH / "miniwerk.key", help="JWT signing key")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+- seconds of random variation on latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests to fail with 503")
+    parser.add_argument("--padding", type=int, default=0, help="Bytes of filler in each JSON response")
+    parser.add_argument("--keysize", type=int, default=2048, help="RSA key size for issued PFX bundles")
+    parser.add_argument("--keytype", choices=sorted(DER_GENERATORS), default="rsa", help="CA and PFX key type")
+    parser.add_argument("--key-pool", type=int, default=0, help="Pre-generated keys to keep ready for enduserpfx")
+    parser.add_argument("--crl-delta-limit", type=int, default=0, help="Revocations to keep in the delta CRL")
+    parser.add_argument("--crl-entries", type=int, default=0, help="Made up revoked serials to start the CRL with")
+    args = parser.parse_args()
+    init_logging(logging.INFO)
+    issuer, verifier = load_jwt_keys(args.keyfile)
+    config = StubConfig(
+        latency=args.latency,
+        latency_jitter=args.jitter,
+        error_rate=args.error_rate,
+        padding=args.padding,
+        keysize=args.keysize,
+        keytype=args.keytype,
+        key_pool=args.key_pool,
+        crl_delta_limit=args.crl_delta_limit,
+    )
+    stub = StubAPI(issuer, verifier, config)
+    stub.ca.prefill(args.crl_entries)
+    web.run_app(stub.create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@ import aiohttp
 import pytest
 
 from .conftest import DEFAULT_TIMEOUT, API, VER
+from .crlbench import fetch_crl
+from .revocation import delta_applies, delta_base_number, load_crl
 
 LOGGER = logging.getLogger(__name__)
 
@@ -40,3 +42,36 @@ def test_localhost_fetch_crl() -> None:
     url = f"http://127.0.0.1:8000/api/{VER}/utils/crl"
     response = requests.get(url, json=None, headers=None, verify=False, timeout=DEFAULT_TIMEOUT.total)
     assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_ca_crl_conditional_fetch(
+    session_with_testcas: aiohttp.ClientSession,
+) -> None:
+    """Refetching an unchanged CRL via /ca/crl/ with its validators gets 304 and no body"""
+    client = session_with_testcas
+    url = API.rsplit("/api", 1)[0] + "/ca/crl/"
+    full = await fetch_crl(client, url)
+    assert full.status == 200
+    if not full.validators():
+        pytest.skip("API does not send ETag/Last-Modified for the CRL")
+    again = await fetch_crl(client, url, full.validators())
+    assert again.status == 304
+    assert again.received < full.received
+
+
+@pytest.mark.asyncio
+async def test_localmaeher_delta_crl(
+    session_with_testcas: aiohttp.ClientSession,
+) -> None:
+    """If the API publishes a delta CRL it must apply to the base CRL it serves"""
+    client = session_with_testcas
+    response = await client.get(f"{API}/{VER}/utils/crl", timeout=DEFAULT_TIMEOUT)
+    response.raise_for_status()
+    base = load_crl(await response.read())
+    assert delta_base_number(base) is None
+    response = await client.get(f"{API}/{VER}/utils/crl/delta", timeout=DEFAULT_TIMEOUT)
+    if response.status == 404:
+        pytest.skip("API does not publish delta CRLs")
+    response.raise_for_status()
+    assert delta_applies(base, load_crl(await response.read()))
@@ -0,0 +1,300 @@
+"""Check that the offline stub API implements the enrollment contract the harness relies on"""
+
+from typing import AsyncGenerator, Optional, Tuple
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import datetime
+import logging
+import socket
+import sys
+import time
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from cryptography.hazmat.primitives.serialization import pkcs12
+from cryptography.x509 import ocsp
+from multikeyjwt import Issuer
+
+from .clientpool import ClientFactory
+from .conftest import DEFAULT_TIMEOUT, VER, random_callsign
+from .crlbench import fetch_crl
+from .keypool import KeyPool, generate_key
+from .ocspstore import OCSPStore, StoredResponse
+from .revocation import RevocationProbe, RevokedSubject, crl_number, delta_applies, ocsp_request_der
+from .stubapi import StubAPI, StubCA, load_jwt_keys
+from .waiting import ConditionTimeout, wait_until
+
+LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=W0621
+
+
+@pytest_asyncio.fixture
+async def stub_api(tmp_path: Path) -> AsyncGenerator[Tuple[str, Issuer], None]:
+    """Run the stub with a throwaway JWT key on a free port, yields API base and issuer"""
+    keyfile = tmp_path / "stub.key"
+    keyfile.write_bytes(
+        rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.TraditionalOpenSSL,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+    )
+    issuer, verifier = load_jwt_keys(keyfile)
+    runner = web.AppRunner(StubAPI(issuer, verifier).create_app())
+    await runner.setup()
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    yield f"http://127.0.0.1:{port}/api", issuer
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_stub_enrollment_flow(stub_api: Tuple[str, Issuer], client_factory: ClientFactory) -> None:
+    """firstuser -> invitecode -> enroll -> accept -> enduserpfx -> revoke against the stub"""
+    api, issuer = stub_api
+    async with client_factory.session() as client:
+        tpjwt = issuer.issue({"sub": "tpadminsession", "anon_admin_session": True})
+        resp = await client.post(
+            f"{api}/{VER}/token/code/generate",
+            json={"claims": {"anon_admin_session": True}},
+            headers={"Authorization": f"Bearer {tpjwt}"},
+            timeout=DEFAULT_TIMEOUT,
+        )
+        resp.raise_for_status()
+        resp = await client.post(f"{api}/{VER}/token/code/exchange", json=await resp.json(), timeout=DEFAULT_TIMEOUT)
+        resp.raise_for_status()
+        resp = await client.post(
+            f"{api}/{VER}/firstuser/add-admin",
+            json={"callsign": random_callsign()},
+            headers={"Authorization": f"Bearer {(await resp.json())['jwt']}"},
+            timeout=DEFAULT_TIMEOUT,
+        )
+        resp.raise_for_status()
+        assert (await resp.json())["admin_added"] is True
+
+        # No Authorization header stands in for admin mTLS
+        resp = await client.post(f"{api}/{VER}/enrollment/invitecode/create", timeout=DEFAULT_TIMEOUT)
+        resp.raise_for_status()
+        invite_code = (await resp.json())["invite_code"]
+        resp = await client.post(
+            f"{api}/{VER}/enrollment/invitecode/enroll",
+            json={"invite_code": invite_code, "callsign": random_callsign()},
+            timeout=DEFAULT_TIMEOUT,
+        )
+        resp.raise_for_status()
+        enrolled = await resp.json()
+        user_auth = {"Authorization": f"Bearer {enrolled['jwt']}"}
+        resp = await client.post(
+            f"{api}/{VER}/enrollment/accept",
+            json={"callsign": enrolled["callsign"], "approvecode": enrolled["approvecode"]},
+            timeout=DEFAULT_TIMEOUT,
+        )
+        resp.raise_for_status()
+        resp = await client.get(
+            f"{api}/{VER}/enduserpfx/{enrolled['callsign']}.pfx", headers=user_auth, timeout=DEFAULT_TIMEOUT
+        )
+        resp.raise_for_status()
+        assert client_factory.credentials.add(enrolled["callsign"], await resp.read())
+
+        resp = await client.delete(f"{api}/{VER}/people/{enrolled['callsign']}", timeout=DEFAULT_TIMEOUT)
+        resp.raise_for_status()
+        resp = await client.get(f"{api}/{VER}/instructions/user", headers=user_auth, timeout=DEFAULT_TIMEOUT)
+        assert resp.status == 403
+        resp = await client.get(f"{api}/{VER}/utils/crl", timeout=DEFAULT_TIMEOUT)
+        resp.raise_for_status()
+        crl = x509.load_der_x509_crl(await resp.read())
+        assert len(list(crl)) == 1
+    client_factory.credentials.discard(enrolled["callsign"])
+
+
+@pytest.mark.asyncio
+async def test_stub_crl_validators(stub_api: Tuple[str, Issuer], client_factory: ClientFactory) -> None:
+    """CRL has strong validators and cache headers, conditional refetches get 304"""
+    api, _ = stub_api
+    url = f"{api}/{VER}/utils/crl"
+    async with client_factory.session() as client:
+        full = await fetch_crl(client, url)
+        assert full.status == 200
+        assert full.etag and not full.etag.startswith("W/")
+        assert (await fetch_crl(client, url, {"If-None-Match": full.etag})).status == 304
+        assert full.last_modified
+        assert (await fetch_crl(client, url, {"If-Modified-Since": full.last_modified})).status == 304
+        assert (await fetch_crl(client, url, {"If-None-Match": '"stale"'})).status == 200
+        resp = await client.get(url, timeout=DEFAULT_TIMEOUT)
+        assert "max-age=" in resp.headers["Cache-Control"]
+        resp.release()
+
+
+@pytest.mark.asyncio
+async def test_key_pool_refills() -> None:
+    """Pool fills up in the background, take() hands out ready keys and misses when empty"""
+    pool = KeyPool(2)
+    assert pool.take() is None  # Not started, nothing to give
+    await pool.start()
+    try:
+
+        async def pool_full() -> bool:
+            """Both keys generated"""
+            return len(pool) == 2
+
+        await wait_until(pool_full, name="key_pool_full")
+        key = pool.take()
+        assert isinstance(key, rsa.RSAPrivateKey)
+        assert pool.hits == 1
+        await wait_until(pool_full, name="key_pool_refilled")
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_wait_until_hung_condition() -> None:
+    """A condition that never returns is cancelled at the deadline"""
+
+    async def hangs() -> bool:
+        """Like a probe stuck on a connection that never answers"""
+        await asyncio.sleep(60)
+        return True
+
+    started = time.perf_counter()
+    with pytest.raises(ConditionTimeout):
+        await wait_until(hangs, name="hangs", deadline=0.2)
+    assert time.perf_counter() - started < 5
+
+
+def test_ecdsa_pfx_to_mtls_context(client_factory: ClientFactory) -> None:
+    """The harness handles ECDSA P-256 bundles the same way as RSA ones"""
+    stubca = StubCA(keytype="ecdsa")
+    _, pfx = stubca.issue_pfx("ECDSAUSER")
+    pfxdata = pkcs12.load_pkcs12(pfx, b"ECDSAUSER")
+    assert isinstance(pfxdata.key, ec.EllipticCurvePrivateKey)
+    assert client_factory.credentials.add("ECDSAUSER", pfx)
+    client_factory.credentials.discard("ECDSAUSER")
+
+
+def test_ocsp_store_refresh_and_revoke() -> None:
+    """Responses are pre-signed, re-signed inside the margin and switched to REVOKED on revocation"""
+    stubca = StubCA(keytype="ecdsa")
+    store = OCSPStore(
+        stubca.cert, stubca.key, validity=datetime.timedelta(minutes=10), margin=datetime.timedelta(minutes=1)
+    )
+    cert = stubca.issue_cert("OCSPUSER", generate_key("ecdsa"))
+    store.add(cert)
+    request = ocsp_request_der(cert, stubca.cert)
+    assert ocsp.load_der_ocsp_response(store.lookup(request)).certificate_status == ocsp.OCSPCertStatus.GOOD
+    assert store.refresh_due() == 0
+    store.margin = datetime.timedelta(minutes=11)
+    assert store.metrics()["refresh_lag_seconds"] > 0
+    assert store.refresh_due() == 1
+    store.revoke(cert.serial_number)
+    assert ocsp.load_der_ocsp_response(store.lookup(request)).certificate_status == ocsp.OCSPCertStatus.REVOKED
+    assert store.signatures == 3
+    unknown = stubca.issue_cert("UNKNOWN", generate_key("ecdsa"))
+    response = ocsp.load_der_ocsp_response(store.lookup(ocsp_request_der(unknown, stubca.cert)))
+    assert response.response_status == ocsp.OCSPResponseStatus.UNAUTHORIZED
+
+
+def test_ocsp_store_threads() -> None:
+    """Refreshing while other threads add and revoke neither fails nor puts back a GOOD response for a revoked cert"""
+    stubca = StubCA(keytype="ecdsa")
+    store = OCSPStore(stubca.cert, stubca.key, margin=datetime.timedelta(hours=2))  # every response is always due
+    certs = [stubca.issue_cert(f"THREADUSER{idx}", generate_key("ecdsa")) for idx in range(200)]
+
+    def add_and_revoke(idx: int) -> None:
+        store.add(certs[idx])
+        if idx % 2:
+            store.revoke(certs[idx].serial_number)
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Switch threads often enough to hit the dict iterations
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            refreshes = [executor.submit(store.refresh_due) for _ in range(20)]
+            list(executor.map(add_and_revoke, range(len(certs))))
+            assert all(future.result() >= 0 for future in refreshes)
+    finally:
+        sys.setswitchinterval(switch_interval)
+    for idx, cert in enumerate(certs):
+        status = ocsp.load_der_ocsp_response(store.lookup(ocsp_request_der(cert, stubca.cert))).certificate_status
+        assert status == (ocsp.OCSPCertStatus.REVOKED if idx % 2 else ocsp.OCSPCertStatus.GOOD)
+
+
+def test_ocsp_store_revoke_during_refresh() -> None:
+    """A GOOD response signed by a refresh that started before the revocation is not stored over the REVOKED one"""
+    stubca = StubCA(keytype="ecdsa")
+
+    class RevokingStore(OCSPStore):
+        """Revokes the certificate from "another thread" while the refresh is signing"""
+
+        def _signed(self, cert: x509.Certificate, revoked_at: Optional[datetime.datetime]) -> StoredResponse:
+            stored = super()._signed(cert, revoked_at)
+            if revoked_at is None and self.signatures:
+                self.revoke(cert.serial_number)
+            return stored
+
+    store = RevokingStore(stubca.cert, stubca.key, margin=datetime.timedelta(hours=2))
+    cert = stubca.issue_cert("RACEUSER", generate_key("ecdsa"))
+    store.add(cert)
+    assert store.refresh_due() == 0
+    response = ocsp.load_der_ocsp_response(store.lookup(ocsp_request_der(cert, stubca.cert)))
+    assert response.certificate_status == ocsp.OCSPCertStatus.REVOKED
+
+
+def test_stub_delta_crl() -> None:
+    """Revocations collect in the delta CRL until delta_limit, then the base CRL is re-signed"""
+    stubca = StubCA(keytype="ecdsa", delta_limit=2)
+    stubca.prefill(100)
+    base = x509.load_der_x509_crl(stubca.crl().der)
+    assert len(list(base)) == 100
+    stubca.revoke(1)
+    stubca.revoke(2)
+    delta = x509.load_der_x509_crl(stubca.delta_crl().der)
+    assert delta_applies(base, delta)
+    assert len(list(delta)) == 2
+    assert x509.load_der_x509_crl(stubca.crl().der) == base  # Base not re-signed yet
+    stubca.revoke(3)
+    rebased = x509.load_der_x509_crl(stubca.crl().der)
+    assert len(list(rebased)) == 103
+    assert crl_number(rebased) == (crl_number(delta) or 0) + 1
+    assert not list(x509.load_der_x509_crl(stubca.delta_crl().der))
+
+
+@pytest.mark.asyncio
+async def test_mtls_probe_counts_error_redirect(client_factory: ClientFactory) -> None:
+    """The rasenmaeher mtls. host redirects a refused client cert to /error, the probe counts that as rejected"""
+    refused = {"verify": ""}
+
+    async def instructions(_request: web.Request) -> web.Response:
+        """Like the vhost: 302 to the error page unless $ssl_client_verify is SUCCESS"""
+        if refused["verify"]:
+            raise web.HTTPFound(f"https://localmaeher.dev.pvarki.fi/error?code=mtls_fail&exta={refused['verify']}")
+        return web.json_response({"callsign": "REVOKEME"})
+
+    app = web.Application()
+    app.router.add_get("/api/v1/instructions/user", instructions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    try:
+        _, pfx = StubCA(keytype="ecdsa").issue_pfx("REVOKEME")
+        ssl_ctx = client_factory.credentials.add("REVOKEME", pfx)
+        subject = RevokedSubject.from_pfx("REVOKEME", "", pfx, ssl_ctx)
+        api = f"http://127.0.0.1:{port}/api"
+        probe = RevocationProbe(client_factory, api, api)
+        assert not await probe.mtls_rejects(subject)
+        refused["verify"] = "FAILED:certificate revoked"
+        assert await probe.mtls_rejects(subject)
+    finally:
+        client_factory.credentials.discard("REVOKEME")
+        await runner.cleanup()
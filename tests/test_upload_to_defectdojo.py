@@ -0,0 +1,326 @@
+"""Check the Grype report compaction and the streamed upload body of the DefectDojo upload script"""
+
+from typing import Any, Dict, List, Tuple
+from pathlib import Path
+import importlib.util
+import io
+import json
+import random
+import re
+import socket
+import sys
+import threading
+
+import pytest
+
+SCRIPT_PATH = Path(__file__).parent.parent / ".github" / "scripts" / "security" / "upload_to_defectdojo.py"
+_SPEC = importlib.util.spec_from_file_location("upload_to_defectdojo", SCRIPT_PATH)
+assert _SPEC and _SPEC.loader
+uploader = importlib.util.module_from_spec(_SPEC)
+sys.modules[_SPEC.name] = uploader  # dataclasses look the module up while the script is executed
+_SPEC.loader.exec_module(uploader)
+
+READ_SIZES = (1, 2, 3, 5, 7, 16, 64, 4096)
+
+
+def grype_match(idx: int) -> Dict[str, Any]:
+    """Match with the metadata Grype puts in, values chosen to land on chunk boundaries in different ways"""
+    return {
+        "vulnerability": {
+            "id": f"CVE-2024-{idx % 7}",
+            "severity": "High",
+            "description": 'Escapes \\ "quotes" ] } [ { and ünïcödé ☃ \n',
+            "cvss": [{"metrics": {"baseScore": 7.5, "exploitabilityScore": -25000000000.5e3}}],
+            "epss": [{"epss": 1.2e-05, "percentile": 0.0, "date": "2026-10-18"}],
+            "risk": 12.5e2,
+        },
+        "relatedVulnerabilities": (
+            [{"id": f"GHSA-{idx % 7}", "urls": ["https://example.com/a?b=[c]"]}] if idx % 2 else []
+        ),
+        "matchDetails": [{"type": "exact-direct-match", "matcher": "apk-matcher", "searchedBy": {"distro": [1, 2.0]}}],
+        "artifact": {
+            "name": f"pkg{idx % 7}",
+            "version": "1.0",
+            "type": "apk",
+            "purl": f"pkg:apk/alpine/pkg{idx % 7}",
+            "locations": [{"path": "/lib/apk/db/installed", "layerID": "sha256:00"}],
+            "metadata": {"files": [{"path": f"/usr/{idx}/{{}}"}] * 3, "size": 0, "flag": False, "none": None},
+        },
+    }
+
+
+def grype_report(matches: int) -> Dict[str, Any]:
+    """Matches between the metadata Grype writes around them"""
+    return {
+        "source": {"type": "image", "target": {"layers": [{"size": 1e3, "digest": "sha256:\\}"}] * 5}},
+        "matches": [grype_match(idx) for idx in range(matches)],
+        "ignoredMatches": [grype_match(idx) for idx in range(3)],
+        "distro": {"name": "alpine", "version": "3.20"},
+        "descriptor": {"name": "grype", "timestamp": "2026-10-18T00:00:00Z", "configuration": {"nested": [[[]]]}},
+    }
+
+
+def reference_compaction(report: Dict[str, Any]) -> bytes:
+    """compact_report done the simple way, with the whole report in memory"""
+    encoded: List[str] = []
+    for match in report["matches"]:
+        compacted = json.dumps(uploader.compact_match(match), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        if compacted not in encoded:
+            encoded.append(compacted)
+    return ('{"matches":[' + ",".join(encoded) + "]}").encode("utf-8")
+
+
+@pytest.mark.parametrize("indent", [None, 1])
+def test_compact_report_matches_json_loads(tmp_path: Path, indent: Any) -> None:
+    """Streamed compaction writes what json.loads + compact_match gives, whatever the read size"""
+    report = grype_report(20)
+    report_path = tmp_path / "report.json"
+    report_path.write_text(json.dumps(report, indent=indent, ensure_ascii=False), encoding="utf-8")
+    expected = reference_compaction(report)
+    for read_size in READ_SIZES:
+        output = io.BytesIO()
+        compacted = uploader.compact_report(report_path, output, read_size)
+        assert output.getvalue() == expected, read_size
+        assert compacted.matches == 14
+        assert compacted.duplicates == 6
+        assert compacted.compacted_bytes == len(expected)
+
+
+def test_compact_report_hash_ignores_volatile_fields(tmp_path: Path) -> None:
+    """Scan metadata and EPSS scores are uploaded but do not change the content hash"""
+    report = grype_report(3)
+    report_path = tmp_path / "report.json"
+    report_path.write_text(json.dumps(report), encoding="utf-8")
+    digest = uploader.report_content_hash(report_path)
+    report["descriptor"]["timestamp"] = "2026-10-19T00:00:00Z"
+    for match in report["matches"]:
+        match["vulnerability"]["epss"][0]["date"] = "2026-10-19"
+        match["vulnerability"]["risk"] = 1.0
+    report_path.write_text(json.dumps(report), encoding="utf-8")
+    assert uploader.report_content_hash(report_path) == digest
+    report["matches"][0]["vulnerability"]["severity"] = "Critical"
+    report_path.write_text(json.dumps(report), encoding="utf-8")
+    assert uploader.report_content_hash(report_path) != digest
+
+
+def random_value(rng: random.Random, depth: int = 0) -> Any:
+    """Random JSON value, numbers in all the shapes JSON allows"""
+    kind = rng.randrange(6 if depth < 4 else 4)
+    if kind == 0:
+        return rng.choice([0, -1, 10 ** rng.randrange(20), -(10**15) - 1])
+    if kind == 1:
+        return rng.choice([0.5, -25000000000.5, 1.5e-7, -2e300, rng.uniform(-1e6, 1e6)])
+    if kind == 2:
+        return "".join(rng.choice('ab"\\]}[{,: ä☃\n') for _ in range(rng.randrange(6)))
+    if kind == 3:
+        return rng.choice([True, False, None, ""])
+    if kind == 4:
+        return [random_value(rng, depth + 1) for _ in range(rng.randrange(4))]
+    return {f"k{idx}": random_value(rng, depth + 1) for idx in range(rng.randrange(4))}
+
+
+def test_json_stream_reader_fuzz() -> None:
+    """Reading the members of random objects agrees with json.loads at every read size"""
+    rng = random.Random(20261018)
+    for _ in range(200):
+        document = json.dumps({f"m{idx}": random_value(rng) for idx in range(rng.randrange(1, 5))}, ensure_ascii=False)
+        skipped = rng.randrange(4)
+        for read_size in (1, rng.randrange(2, 9), rng.randrange(9, 200)):
+            reader = uploader.JsonStreamReader(io.StringIO(document), read_size)
+            decoded = {}
+            for idx, key in enumerate(reader.members()):
+                if idx == skipped:
+                    reader.skip()
+                else:
+                    decoded[key] = reader.value()
+            assert reader.peek() == ""
+            expected = {key: value for idx, (key, value) in enumerate(json.loads(document).items()) if idx != skipped}
+            assert decoded == expected, (document, read_size)
+
+
+def test_compact_report_rejects_broken_json(tmp_path: Path) -> None:
+    """Truncated reports fail instead of uploading half of the matches"""
+    report_path = tmp_path / "report.json"
+    report_path.write_text(json.dumps(grype_report(2))[:-20], encoding="utf-8")
+    with pytest.raises(ValueError):
+        uploader.compact_report(report_path)
+
+
+def multipart_payload(boundary: str, fields: Dict[str, str], file_path: Path) -> bytes:
+    """The payload as the upload script built it in memory before the body was streamed"""
+    payload = io.BytesIO()
+    for key, value in fields.items():
+        payload.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n'.encode("utf-8"))
+        payload.write(f"{value}\r\n".encode("utf-8"))
+    payload.write(f"--{boundary}\r\n".encode("utf-8"))
+    payload.write(f'Content-Disposition: form-data; name="file"; filename="{file_path.name}"\r\n'.encode("utf-8"))
+    payload.write(b"Content-Type: application/json\r\n\r\n")
+    payload.write(file_path.read_bytes())
+    payload.write(f"\r\n--{boundary}--\r\n".encode("utf-8"))
+    return payload.getvalue()
+
+
+def test_multipart_payload_byte_identity(tmp_path: Path) -> None:
+    """The streamed body is byte for byte the payload built in memory, its length is right and it can be resent"""
+    report_path = tmp_path / "report.json"
+    report_path.write_bytes(bytes(range(256)) * 5000)  # Spans several upload chunks
+    fields = {"scan_type": "Anchore Grype", "product_name": "ghcr.io/pvarki/ä", "auto_create_context": "true"}
+    body = uploader.build_multipart_body(fields, report_path)
+    expected = multipart_payload(body.boundary, fields, report_path)
+    assert b"".join(body) == expected
+    assert b"".join(body) == expected
+    assert body.content_length == len(expected)
+    boundary, payload = uploader.build_multipart_payload(fields, report_path)
+    assert payload == multipart_payload(boundary, fields, report_path)
+
+
+def upload_config(**kwargs: Any) -> Any:
+    """Config for uploads through a fake uploader"""
+    defaults: Dict[str, Any] = {
+        "base_url": "http://127.0.0.1:9",
+        "api_token": "token",
+        "product_type_name": "Rasenmaeher",
+        "engagement_name": "CI",
+        "verify_ssl": False,
+        "dry_run": False,
+        "concurrency": 2,
+        "retry_backoff": 0.0,
+    }
+    defaults.update(kwargs)
+    return uploader.UploadConfig(**defaults)
+
+
+def report_entries(tmp_path: Path, count: int) -> List[Any]:
+    """Entries for count small reports"""
+    entries = []
+    for idx in range(count):
+        report_path = tmp_path / f"image{idx}_grype.json"
+        report_path.write_text(json.dumps(grype_report(idx + 1)), encoding="utf-8")
+        entries.append(uploader.UploadEntry(f"ghcr.io/pvarki/image{idx}:1", "ghcr.io/pvarki/image", report_path))
+    return entries
+
+
+class FakeUploader:  # pylint: disable=too-few-public-methods
+    """Answers with the given statuses (or raises the given errors) in turn, per report name"""
+
+    def __init__(self, *outcomes: Any) -> None:
+        self.outcomes = outcomes
+        self.calls: List[str] = []
+        self.lock = threading.Lock()
+
+    def __call__(self, _config: Any, entry: Any) -> Tuple[int, str]:
+        with self.lock:
+            self.calls.append(entry.report_path.name)
+            outcome = self.outcomes[min(self.calls.count(entry.report_path.name), len(self.outcomes)) - 1]
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome, "{}"
+
+
+def test_retry_backoff(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    """5xx and send errors are retried with growing jittered delays, 4xx and 504 are not"""
+    delays: List[float] = []
+    monkeypatch.setattr(uploader.time, "sleep", delays.append)
+    entry = report_entries(tmp_path, 1)[0]
+    config = upload_config(retries=3, retry_backoff=2.0)
+    fake = FakeUploader(503, ConnectionResetError(), 502, 201)
+    assert uploader.upload_with_retries(fake, config, entry)[0] == 201
+    assert len(fake.calls) == 4
+    for attempt, delay in enumerate(delays):
+        assert 2.0 * 2**attempt * 0.5 <= delay <= 2.0 * 2**attempt
+    for status in (400, 504):
+        fake = FakeUploader(status, 201)
+        assert uploader.upload_with_retries(fake, config, entry)[0] == status
+        assert len(fake.calls) == 1
+    fake = FakeUploader(500)
+    assert uploader.upload_with_retries(fake, config, entry)[0] == 500
+    assert len(fake.calls) == 4
+    fake = FakeUploader(BrokenPipeError())
+    with pytest.raises(BrokenPipeError):
+        uploader.upload_with_retries(fake, config, entry)
+    assert len(fake.calls) == 4
+
+
+def test_lost_response_is_not_resent(tmp_path: Path) -> None:
+    """The server drops the connection after reading the whole reimport: no retry, journaled as unknown"""
+    requests: List[bytes] = []
+
+    def serve(server: socket.socket) -> None:
+        """Read one request in full and hang up without answering"""
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with conn:
+                received = b""
+                while b"\r\n\r\n" not in received:
+                    received += conn.recv(65536)
+                headers, body = received.split(b"\r\n\r\n", 1)
+                length = int(re.search(rb"Content-Length: (\d+)", headers).group(1))  # type: ignore[union-attr]
+                while len(body) < length:
+                    body += conn.recv(65536)
+                requests.append(headers)
+
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        thread = threading.Thread(target=serve, args=(server,), daemon=True)
+        thread.start()
+        config = upload_config(base_url=f"http://127.0.0.1:{server.getsockname()[1]}", retries=3)
+        journal = uploader.UploadJournal(tmp_path / "journal.json")
+        entries = report_entries(tmp_path, 1)
+        try:
+            summary = uploader.process_uploads(entries, config, journal=journal)
+        finally:
+            uploader.close_connection_pools()
+            server.shutdown(socket.SHUT_RDWR)
+    assert len(requests) == 1
+    assert summary.failed == 1
+    assert journal.entries[uploader.entry_key(entries[0])]["status"] == uploader.UploadJournal.UNKNOWN
+
+
+def test_journal_resume(tmp_path: Path) -> None:
+    """A rerun of the same batch only uploads the reports that did not make it"""
+    journal_path = tmp_path / "journal.json"
+    entries = report_entries(tmp_path, 3)
+    config = upload_config(retries=0)
+
+    def first(_config: Any, entry: Any) -> Tuple[int, str]:
+        """image1 fails"""
+        return (400 if entry.report_path.name == "image1_grype.json" else 201), "{}"
+
+    summary = uploader.process_uploads(entries, config, first, journal=uploader.UploadJournal(journal_path))
+    assert (summary.uploaded, summary.failed) == (2, 1)
+    fake = FakeUploader(201)
+    summary = uploader.process_uploads(entries, config, fake, journal=uploader.UploadJournal(journal_path))
+    assert fake.calls == ["image1_grype.json"]
+    assert (summary.uploaded, summary.resumed) == (1, 2)
+    fake = FakeUploader(201)
+    summary = uploader.process_uploads(entries, config, fake, journal=uploader.UploadJournal(journal_path, True))
+    assert len(fake.calls) == 3
+
+
+def test_unchanged_reports_are_skipped(tmp_path: Path) -> None:
+    """Reports with the content hash of the last upload are not sent again unless forced"""
+    state_path = tmp_path / "state.json"
+    entries = report_entries(tmp_path, 2)
+    config = upload_config()
+    state = uploader.UploadState(state_path)
+    assert uploader.process_uploads(entries, config, FakeUploader(201), state=state).uploaded == 2
+    state.save()
+
+    report = grype_report(1)
+    report["descriptor"]["timestamp"] = "2026-10-19T00:00:00Z"
+    entries[0].report_path.write_text(json.dumps(report), encoding="utf-8")
+    report = grype_report(2)
+    report["matches"][0]["vulnerability"]["severity"] = "Critical"
+    entries[1].report_path.write_text(json.dumps(report), encoding="utf-8")
+    fake = FakeUploader(201)
+    summary = uploader.process_uploads(entries, config, fake, state=uploader.UploadState(state_path))
+    assert fake.calls == ["image1_grype.json"]
+    assert (summary.uploaded, summary.unchanged) == (1, 1)
+
+    fake = FakeUploader(201)
+    uploader.process_uploads(entries, upload_config(force=True), fake, state=uploader.UploadState(state_path))
+    assert len(fake.calls) == 2
@@ -1,92 +1,72 @@
 """Tests in sequence to simulate an end-to-end scenario"""
 
-import asyncio
-from typing import AsyncGenerator, cast, Tuple
+from typing import AsyncGenerator, Tuple
+from dataclasses import dataclass
 import logging
-from pathlib import Path
 
 import aiohttp
 import pytest
 import pytest_asyncio
-from flaky import flaky  # type: ignore
 from cryptography.hazmat.primitives.serialization import pkcs12
-from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.hazmat.primitives import serialization
-from libadvian.testhelpers import nice_tmpdir  # pylint: disable=W0611
-from libpvarki.mtlshelp import get_session
 
-from ..conftest import DEFAULT_TIMEOUT, API, VER, CA_PATH
+from ..clientpool import ClientFactory
+from ..conftest import DEFAULT_TIMEOUT, API, VER
+from ..flows import mtls_url
+from ..waiting import ConditionTimings, wait_until
 
 LOGGER = logging.getLogger(__name__)
 
 # pylint: disable=W0621
 
 
-# pylint: disable=too-few-public-methods
-class ValueStorage:
+@dataclass
+class ValueStorage:  # pylint: disable=too-many-instance-attributes
     """Storage for values generated and used in this testsuite"""
 
-    first_user_admin_call_sign = ""
-    first_user_admin_jwt_exchange_code = ""
-    first_user_admin_pfx = b""
-    tp_logintoken_jwt = ""
-    first_user_admin_jwt = ""
-    invite_code = ""
-    call_sign = ""
-    call_sign_jwt = ""
-    approve_code = ""
-    user_pfx = b""
+    first_user_admin_call_sign: str = ""
+    first_user_admin_jwt_exchange_code: str = ""
+    first_user_admin_pfx: bytes = b""
+    tp_logintoken_jwt: str = ""
+    first_user_admin_jwt: str = ""
+    invite_code: str = ""
+    call_sign: str = ""
+    call_sign_jwt: str = ""
+    approve_code: str = ""
+    user_pfx: bytes = b""
 
 
 @pytest_asyncio.fixture
 async def first_admin_jwt_session(
     session_with_testcas: aiohttp.ClientSession,
+    values: ValueStorage,
 ) -> AsyncGenerator[aiohttp.ClientSession, None]:
     """Client with JWT"""
     session = session_with_testcas
-    session.headers.update({"Authorization": f"Bearer {ValueStorage.first_user_admin_jwt}"})
+    session.headers.update({"Authorization": f"Bearer {values.first_user_admin_jwt}"})
     yield session
 
 
 @pytest_asyncio.fixture
 async def first_admin_mtls_session(
     first_admin_jwt_session: aiohttp.ClientSession,
-    nice_tmpdir: str,
+    client_factory: ClientFactory,
+    values: ValueStorage,
 ) -> AsyncGenerator[Tuple[aiohttp.ClientSession, str], None]:
     """mTLS session for the first admin"""
-    if not ValueStorage.first_user_admin_pfx:
+    if not values.first_user_admin_pfx:
         jwtclient = first_admin_jwt_session
-        pfxresponse = await jwtclient.get(f"{API}/{VER}/enduserpfx/{ValueStorage.first_user_admin_call_sign}")
-        ValueStorage.first_user_admin_pfx = await pfxresponse.read()
-    datadir = Path(nice_tmpdir)
-    keypath = datadir / "mtls.key"
-    certpath = datadir / "mtls.cert"
-    pfxdata = pkcs12.load_pkcs12(
-        ValueStorage.first_user_admin_pfx, ValueStorage.first_user_admin_call_sign.encode("utf-8")
-    )
-    private_key = cast(rsa.RSAPrivateKey, pfxdata.key)
-    keypath.write_bytes(
-        private_key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.TraditionalOpenSSL,
-            encryption_algorithm=serialization.NoEncryption(),
-        )
-    )
-    assert pfxdata.cert
-    cert = pfxdata.cert.certificate
-    certpath.write_bytes(cert.public_bytes(encoding=serialization.Encoding.PEM))
-    async with get_session((certpath, keypath), CA_PATH) as client:
-        if "localmaeher" in API:
-            newapi = API.replace("localmaeher", "mtls.localmaeher")
-        else:
-            newapi = API.replace("https://", "https://mtls.")
-        yield client, newapi
+        pfxresponse = await jwtclient.get(f"{API}/{VER}/enduserpfx/{values.first_user_admin_call_sign}")
+        values.first_user_admin_pfx = await pfxresponse.read()
+    ssl_ctx = client_factory.credentials.add(values.first_user_admin_call_sign, values.first_user_admin_pfx)
+    async with client_factory.session(ssl_ctx) as client:
+        yield client, mtls_url()
 
 
 @pytest.mark.asyncio
 async def test_0_create_login_token_for_first_admin(
     session_with_tpjwt: aiohttp.ClientSession,
     session_with_testcas: aiohttp.ClientSession,
+    values: ValueStorage,
 ) -> None:
     """Create a token the first admin can exhcnage for anon_admin jwt to create themselves an user"""
     client = session_with_tpjwt
@@ -98,24 +78,25 @@ async def test_0_create_login_token_for_first_admin(
     }
     response = await client.post(url, json=data, timeout=DEFAULT_TIMEOUT)
     payload = await response.json()
-    ValueStorage.first_user_admin_jwt_exchange_code = payload["code"]
+    values.first_user_admin_jwt_exchange_code = payload["code"]
     client2 = session_with_testcas
     resp2 = await client2.post(
         f"{API}/{VER}/token/code/exchange",
-        json={"code": ValueStorage.first_user_admin_jwt_exchange_code},
+        json={"code": values.first_user_admin_jwt_exchange_code},
         timeout=DEFAULT_TIMEOUT,
     )
     payload2 = await resp2.json()
-    ValueStorage.tp_logintoken_jwt = payload2["jwt"]
+    values.tp_logintoken_jwt = payload2["jwt"]
 
 
 @pytest_asyncio.fixture
 async def session_with_logintoken_jwt(
     session_with_testcas: aiohttp.ClientSession,
+    values: ValueStorage,
 ) -> AsyncGenerator[aiohttp.ClientSession, None]:
     """Use first_user_admin_jwt_exchange_code to get anon_admin JWT to create the first user"""
     client = session_with_testcas
-    client.headers.update({"Authorization": f"Bearer {ValueStorage.tp_logintoken_jwt}"})
+    client.headers.update({"Authorization": f"Bearer {values.tp_logintoken_jwt}"})
     yield client
 
 
@@ -124,6 +105,7 @@ async def test_1_firstuser_add_admin(
     session_with_logintoken_jwt: aiohttp.ClientSession,
     session_with_testcas: aiohttp.ClientSession,
     call_sign_generator: str,
+    values: ValueStorage,
 ) -> None:
     """Tests that we can create new work_id"""
     client = session_with_logintoken_jwt
@@ -139,13 +121,13 @@ async def test_1_firstuser_add_admin(
     LOGGER.debug("payload={}".format(payload))
     assert payload["admin_added"] is True
     assert payload["jwt_exchange_code"] != ""
-    ValueStorage.first_user_admin_call_sign = call_sign_generator
+    values.first_user_admin_call_sign = call_sign_generator
     client2 = session_with_testcas
     resp2 = await client2.post(
         f"{API}/{VER}/token/code/exchange", json={"code": payload["jwt_exchange_code"]}, timeout=DEFAULT_TIMEOUT
     )
     payload2 = await resp2.json()
-    ValueStorage.first_user_admin_jwt = payload2["jwt"]
+    values.first_user_admin_jwt = payload2["jwt"]
 
 
 @pytest.mark.asyncio
@@ -161,6 +143,7 @@ async def test_1_1_check_admin_mtls(first_admin_mtls_session: Tuple[aiohttp.Clie
 @pytest.mark.asyncio
 async def test_2_invite_code_create(
     first_admin_mtls_session: Tuple[aiohttp.ClientSession, str],
+    values: ValueStorage,
 ) -> None:
     """Tests that we can create a new invite code"""
     client, api = first_admin_mtls_session
@@ -171,7 +154,7 @@ async def test_2_invite_code_create(
     payload = await response.json()
     LOGGER.debug("payload={}".format(payload))
     assert payload["invite_code"] != ""
-    ValueStorage.invite_code = payload["invite_code"]
+    values.invite_code = payload["invite_code"]
 
 
 @pytest.mark.asyncio
@@ -200,10 +183,11 @@ async def test_2_5_invite_code_create_many_and_list(
 @pytest.mark.asyncio
 async def test_3_invite_code_is_ok(
     session_with_testcas: aiohttp.ClientSession,
+    values: ValueStorage,
 ) -> None:
     """Tests that we can verify that the given invite code is ok"""
     client = session_with_testcas
-    url = f"{API}/{VER}/enrollment/invitecode?invitecode={ValueStorage.invite_code}"
+    url = f"{API}/{VER}/enrollment/invitecode?invitecode={values.invite_code}"
     LOGGER.debug("Fetching {}".format(url))
     response = await client.get(url, timeout=DEFAULT_TIMEOUT)
     response.raise_for_status()
@@ -216,6 +200,7 @@ async def test_3_invite_code_is_ok(
 async def test_4_invite_code_enroll(
     session_with_testcas: aiohttp.ClientSession,
     call_sign_generator: str,
+    values: ValueStorage,
 ) -> None:
     """
     Tests that we can enroll using valid invite_code
@@ -223,7 +208,7 @@ async def test_4_invite_code_enroll(
     client = session_with_testcas
     url = f"{API}/{VER}/enrollment/invitecode/enroll"
     data = {
-        "invite_code": f"{ValueStorage.invite_code}",
+        "invite_code": f"{values.invite_code}",
         "callsign": f"{call_sign_generator}",
     }
     LOGGER.debug("Fetching {}".format(url))
@@ -232,14 +217,15 @@ async def test_4_invite_code_enroll(
     response.raise_for_status()
     payload = await response.json()
     LOGGER.debug("payload={}".format(payload))
-    ValueStorage.call_sign = payload["callsign"]
-    ValueStorage.call_sign_jwt = payload["jwt"]
-    ValueStorage.approve_code = payload["approvecode"]
+    values.call_sign = payload["callsign"]
+    values.call_sign_jwt = payload["jwt"]
+    values.approve_code = payload["approvecode"]
 
 
 @pytest.mark.asyncio
 async def test_5_enrollment_list_for_available_call_sign(
     first_admin_mtls_session: Tuple[aiohttp.ClientSession, str],
+    values: ValueStorage,
 ) -> None:
     """Tests that we have call_sign available for enrollment"""
     client, api = first_admin_mtls_session
@@ -254,7 +240,7 @@ async def test_5_enrollment_list_for_available_call_sign(
         assert item["callsign"] != "" or item["callsign"] == ""
         assert item["approvecode"] == ""  # API got changed we do not return approvecodes anymore
         assert item["state"] == 0 or item["state"] == 1
-        if item["callsign"] == ValueStorage.call_sign and item["state"] == 0:
+        if item["callsign"] == values.call_sign and item["state"] == 0:
             found_enroll_call_sign = True
     assert found_enroll_call_sign is True
 
@@ -262,10 +248,11 @@ async def test_5_enrollment_list_for_available_call_sign(
 @pytest.mark.asyncio
 async def test_6_call_sign_not_accepted(
     session_with_testcas: aiohttp.ClientSession,
+    values: ValueStorage,
 ) -> None:
     """Tests that call_sign has not yet accepted"""
     client = session_with_testcas
-    client.headers.update({"Authorization": f"Bearer {ValueStorage.call_sign_jwt}"})
+    client.headers.update({"Authorization": f"Bearer {values.call_sign_jwt}"})
     url = f"{API}/{VER}/enrollment/have-i-been-accepted"
     LOGGER.debug("Fetching {}".format(url))
     response = await client.get(url, timeout=DEFAULT_TIMEOUT)
@@ -278,6 +265,7 @@ async def test_6_call_sign_not_accepted(
 @pytest.mark.asyncio
 async def test_7_enrollment_accept_call_sign(
     first_admin_mtls_session: Tuple[aiohttp.ClientSession, str],
+    values: ValueStorage,
 ) -> None:
     """
     Tests that we can accept call_sign
@@ -285,8 +273,8 @@ async def test_7_enrollment_accept_call_sign(
     client, api = first_admin_mtls_session
     url = f"{api}/{VER}/enrollment/accept"
     data = {
-        "callsign": f"{ValueStorage.call_sign}",
-        "approvecode": f"{ValueStorage.approve_code}",
+        "callsign": f"{values.call_sign}",
+        "approvecode": f"{values.approve_code}",
     }
     LOGGER.debug("Fetching {}".format(url))
     LOGGER.debug("Data: {}".format(data))
@@ -299,10 +287,11 @@ async def test_7_enrollment_accept_call_sign(
 @pytest.mark.asyncio
 async def test_8_call_sign_accepted(
     session_with_testcas: aiohttp.ClientSession,
+    values: ValueStorage,
 ) -> None:
     """Tests that call_sign has been accepted"""
     client = session_with_testcas
-    client.headers.update({"Authorization": f"Bearer {ValueStorage.call_sign_jwt}"})
+    client.headers.update({"Authorization": f"Bearer {values.call_sign_jwt}"})
     url = f"{API}/{VER}/enrollment/have-i-been-accepted"
     LOGGER.debug("Fetching {}".format(url))
     response = await client.get(url, timeout=DEFAULT_TIMEOUT)
@@ -315,15 +304,16 @@ async def test_8_call_sign_accepted(
 @pytest.mark.asyncio
 async def test_9_check_if_enduser_pfx_available(
     session_with_testcas: aiohttp.ClientSession,
+    values: ValueStorage,
 ) -> None:
     """Tests that we can check if the pfx bundle is available for the given callsign"""
     client = session_with_testcas
-    client.headers.update({"Authorization": f"Bearer {ValueStorage.call_sign_jwt}"})
-    url = f"{API}/{VER}/enduserpfx/{ValueStorage.call_sign}.pfx"
+    client.headers.update({"Authorization": f"Bearer {values.call_sign_jwt}"})
+    url = f"{API}/{VER}/enduserpfx/{values.call_sign}.pfx"
     LOGGER.debug("Fetching {}".format(url))
     response = await client.get(url, timeout=DEFAULT_TIMEOUT)
     response.raise_for_status()
-    pfxdata = pkcs12.load_pkcs12(await response.read(), ValueStorage.call_sign.encode("utf-8"))
+    pfxdata = pkcs12.load_pkcs12(await response.read(), values.call_sign.encode("utf-8"))
     assert pfxdata.key
     assert pfxdata.cert
 
@@ -331,62 +321,56 @@ async def test_9_check_if_enduser_pfx_available(
 @pytest_asyncio.fixture
 async def user_mtls_session(
     session_with_testcas: aiohttp.ClientSession,
-    nice_tmpdir: str,
+    client_factory: ClientFactory,
+    values: ValueStorage,
 ) -> AsyncGenerator[Tuple[aiohttp.ClientSession, str], None]:
     """mTLS session for the enrolled user"""
     client = session_with_testcas
-    if not ValueStorage.user_pfx:
-        client.headers.update({"Authorization": f"Bearer {ValueStorage.call_sign_jwt}"})
-        pfxresponse = await client.get(f"{API}/{VER}/enduserpfx/{ValueStorage.call_sign}.pfx", timeout=DEFAULT_TIMEOUT)
-        ValueStorage.user_pfx = await pfxresponse.read()
+    if not values.user_pfx:
+        client.headers.update({"Authorization": f"Bearer {values.call_sign_jwt}"})
+        pfxresponse = await client.get(f"{API}/{VER}/enduserpfx/{values.call_sign}.pfx", timeout=DEFAULT_TIMEOUT)
+        values.user_pfx = await pfxresponse.read()
         del client.headers["Authorization"]
-    datadir = Path(nice_tmpdir)
-    keypath = datadir / "user_mtls.key"
-    certpath = datadir / "user_mtls.cert"
-    pfxdata = pkcs12.load_pkcs12(ValueStorage.user_pfx, ValueStorage.call_sign.encode("utf-8"))
-    private_key = cast(rsa.RSAPrivateKey, pfxdata.key)
-    keypath.write_bytes(
-        private_key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.TraditionalOpenSSL,
-            encryption_algorithm=serialization.NoEncryption(),
-        )
-    )
-    assert pfxdata.cert
-    cert = pfxdata.cert.certificate
-    certpath.write_bytes(cert.public_bytes(encoding=serialization.Encoding.PEM))
-    async with get_session((certpath, keypath), CA_PATH) as client:
-        if "localmaeher" in API:
-            newapi = API.replace("localmaeher", "mtls.localmaeher")
-        else:
-            newapi = API.replace("https://", "https://mtls.")
-        yield client, newapi
+    ssl_ctx = client_factory.credentials.add(values.call_sign, values.user_pfx)
+    async with client_factory.session(ssl_ctx) as client:
+        yield client, mtls_url()
 
 
-@flaky(max_runs=3, min_passes=1)  # type: ignore
 @pytest.mark.asyncio
 @pytest.mark.parametrize("productname", ["tak", "fake"])
-async def test_11_check_product_healths(user_mtls_session: Tuple[aiohttp.ClientSession, str], productname: str) -> None:
+async def test_11_check_product_healths(
+    user_mtls_session: Tuple[aiohttp.ClientSession, str],
+    productname: str,
+    condition_timings: ConditionTimings,
+    values: ValueStorage,
+) -> None:
     """Check that we can get files from product integration apis"""
-    # Wait a moment so we have less of race issues
-    await asyncio.sleep(2.0)
     client, api = user_mtls_session
     base = api.replace(":4439/api", ":4626/").replace("mtls.", f"{productname}.")
     url = f"{base}api/v1/healthcheck"
-    LOGGER.debug("Fetching {} (for {})".format(url, ValueStorage.call_sign))
-    response = await client.get(url, timeout=DEFAULT_TIMEOUT)
-    response.raise_for_status()
-    payload = await response.json()
-    LOGGER.debug("payload={} (for {})".format(payload, ValueStorage.call_sign))
+
+    async def product_sees_user() -> bool:
+        """The product has been told about the new user"""
+        LOGGER.debug("Fetching {} (for {})".format(url, values.call_sign))
+        try:
+            response = await client.get(url, timeout=DEFAULT_TIMEOUT)
+        except aiohttp.ClientError as exc:
+            LOGGER.debug("Got {!r} from {}".format(exc, url))
+            return False
+        LOGGER.debug("payload={} (for {})".format(await response.text(), values.call_sign))
+        return response.status == 200
+
+    await wait_until(product_sees_user, name=f"{productname}_sees_new_user", timings=condition_timings)
 
 
 @pytest.mark.asyncio
 async def test_12_check_user_revoke(
     first_admin_mtls_session: Tuple[aiohttp.ClientSession, str],
+    values: ValueStorage,
 ) -> None:
     """Test revoking the user"""
     admin, api = first_admin_mtls_session
-    url = f"{api}/{VER}/people/{ValueStorage.call_sign}"
+    url = f"{api}/{VER}/people/{values.call_sign}"
     resp = await admin.delete(url)
     LOGGER.debug("got response {} from {}".format(resp, url))
     resp.raise_for_status()
@@ -394,24 +378,28 @@ async def test_12_check_user_revoke(
     assert payload["success"]
 
 
-@flaky(max_runs=3, min_passes=1)  # type: ignore
 @pytest.mark.asyncio
 async def test_13_user_is_revoked(
     session_with_testcas: aiohttp.ClientSession,
     first_admin_mtls_session: Tuple[aiohttp.ClientSession, str],
+    condition_timings: ConditionTimings,
+    values: ValueStorage,
 ) -> None:
     """Test that the user is indeed revoked"""
     admin, api = first_admin_mtls_session
-    url = f"{api}/{VER}/people/{ValueStorage.call_sign}"
+    url = f"{api}/{VER}/people/{values.call_sign}"
     resp = await admin.delete(url)
     LOGGER.debug("got response {} from {}".format(resp, url))
     assert resp.status == 404
 
-    await asyncio.sleep(1)
-
     # FIXME: Use mTLS for the end-user too.
     client = session_with_testcas
-    client.headers.update({"Authorization": f"Bearer {ValueStorage.call_sign_jwt}"})
-    resp = await client.get(f"{API}/{VER}/instructions/user")
-    assert resp.status == 403
+    client.headers.update({"Authorization": f"Bearer {values.call_sign_jwt}"})
+
+    async def api_rejects_user() -> bool:
+        """The revocation has reached the API"""
+        async with client.get(f"{API}/{VER}/instructions/user") as resp:
+            return resp.status == 403
+
+    await wait_until(api_rejects_user, name="api_rejects_revoked_user", timings=condition_timings)
     # TODO: Test the cert revocation too once we get OCSP working
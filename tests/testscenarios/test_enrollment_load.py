@@ -0,0 +1,99 @@
+"""Run the test_cert_bundle enrollment flow for many concurrent virtual users
+
+Disabled unless RM_LOAD_USERS is set, tune with RM_LOAD_ARRIVAL_RATE (users/s) and RM_LOAD_RAMP_UP (seconds)."""
+
+from typing import AsyncGenerator, Tuple
+from dataclasses import asdict
+import json
+import logging
+import os
+from pathlib import Path
+
+import aiohttp
+import pytest
+import pytest_asyncio
+from cryptography.hazmat.primitives.serialization import pkcs12
+from multikeyjwt import Issuer
+
+from ..clientpool import ClientFactory
+from ..conftest import DEFAULT_TIMEOUT, API, VER, random_callsign
+from ..flows import create_admin, mtls_url
+from ..loadgen import LoadProfile, LoadStats, run_load
+
+LOGGER = logging.getLogger(__name__)
+PROFILE = LoadProfile.from_env()
+REPORT_PATH = os.environ.get("RM_LOAD_REPORT")  # pylint: disable=E1101
+pytestmark = pytest.mark.skipif(PROFILE.users < 1, reason="RM_LOAD_USERS not set")
+
+# pylint: disable=W0621
+
+
+@pytest_asyncio.fixture
+async def load_admin_mtls_session(
+    session_with_testcas: aiohttp.ClientSession,
+    tp_issuer: Issuer,
+    client_factory: ClientFactory,
+) -> AsyncGenerator[Tuple[aiohttp.ClientSession, str], None]:
+    """mTLS session for an admin created just for this load run"""
+    callsign, pfx = await create_admin(session_with_testcas, tp_issuer)
+    async with client_factory.session(client_factory.credentials.add(callsign, pfx)) as admin:
+        yield admin, mtls_url()
+
+
+@pytest.mark.asyncio
+async def test_enrollment_load(
+    load_admin_mtls_session: Tuple[aiohttp.ClientSession, str],
+    session_with_testcas: aiohttp.ClientSession,
+) -> None:
+    """invitecode create -> enroll -> accept -> enduserpfx -> revoke for PROFILE.users virtual users"""
+    admin, mtls_api = load_admin_mtls_session
+    client = session_with_testcas
+
+    async def user_flow(idx: int, stats: LoadStats) -> None:
+        """One virtual user going through the enrollment"""
+        async with stats.step("invitecode_create"):
+            async with admin.post(f"{mtls_api}/{VER}/enrollment/invitecode/create", timeout=DEFAULT_TIMEOUT) as resp:
+                resp.raise_for_status()
+                invite_code = (await resp.json())["invite_code"]
+
+        async with stats.step("enroll"):
+            async with client.post(
+                f"{API}/{VER}/enrollment/invitecode/enroll",
+                json={"invite_code": invite_code, "callsign": random_callsign()},
+                timeout=DEFAULT_TIMEOUT,
+            ) as resp:
+                resp.raise_for_status()
+                payload = await resp.json()
+            callsign, user_jwt, approvecode = payload["callsign"], payload["jwt"], payload["approvecode"]
+        LOGGER.debug("Virtual user {} enrolled as {}".format(idx, callsign))
+
+        async with stats.step("accept"):
+            async with admin.post(
+                f"{mtls_api}/{VER}/enrollment/accept",
+                json={"callsign": callsign, "approvecode": approvecode},
+                timeout=DEFAULT_TIMEOUT,
+            ) as resp:
+                resp.raise_for_status()
+
+        async with stats.step("enduserpfx"):
+            async with client.get(
+                f"{API}/{VER}/enduserpfx/{callsign}.pfx",
+                headers={"Authorization": f"Bearer {user_jwt}"},
+                timeout=DEFAULT_TIMEOUT,
+            ) as resp:
+                resp.raise_for_status()
+                pfxdata = pkcs12.load_pkcs12(await resp.read(), callsign.encode("utf-8"))
+            assert pfxdata.cert
+
+        async with stats.step("revoke"):
+            async with admin.delete(f"{mtls_api}/{VER}/people/{callsign}", timeout=DEFAULT_TIMEOUT) as resp:
+                resp.raise_for_status()
+
+    stats = await run_load(PROFILE, user_flow)
+    stats.log_report()
+    if REPORT_PATH:
+        Path(REPORT_PATH).write_text(
+            json.dumps({"profile": asdict(PROFILE), "steps": stats.report()}, indent=2), encoding="utf-8"
+        )
+    for step in stats.steps.values():
+        assert step.errors == 0, f"{step.errors} failures in step {step.name}"
@@ -0,0 +1,78 @@
+"""Revocation propagation probe: how long does a revoked device keep working
+
+Disabled unless RM_REVOCATION_SAMPLES is set. RM_REVOCATION_LAYERS (comma separated, default all of
+api,crl,ocsp,mtls,products) selects the layers, RM_PRODUCTS the products and RM_REVOCATION_DEADLINE the
+seconds to wait per layer."""
+
+from typing import AsyncGenerator
+import functools
+import json
+import logging
+import os
+from pathlib import Path
+
+import aiohttp
+import pytest
+import pytest_asyncio
+from multikeyjwt import Issuer
+
+from ..clientpool import ClientFactory
+from ..conftest import DEFAULT_TIMEOUT, API, VER
+from ..flows import create_admin, enroll_user, mtls_url
+from ..revocation import DEFAULT_LAYERS, RevocationProbe, RevokedSubject
+
+LOGGER = logging.getLogger(__name__)
+SAMPLES = int(os.environ.get("RM_REVOCATION_SAMPLES", "0"))  # pylint: disable=E1101
+LAYERS = os.environ.get("RM_REVOCATION_LAYERS", ",".join(DEFAULT_LAYERS)).split(",")  # pylint: disable=E1101
+PRODUCTS = os.environ.get("RM_PRODUCTS", "tak,fake").split(",")  # pylint: disable=E1101
+DEADLINE = float(os.environ.get("RM_REVOCATION_DEADLINE", "120"))  # pylint: disable=E1101
+REPORT_PATH = os.environ.get("RM_REVOCATION_REPORT")  # pylint: disable=E1101
+pytestmark = pytest.mark.skipif(SAMPLES < 1, reason="RM_REVOCATION_SAMPLES not set")
+
+# pylint: disable=W0621
+
+
+@pytest_asyncio.fixture
+async def probe_admin_session(
+    session_with_testcas: aiohttp.ClientSession,
+    tp_issuer: Issuer,
+    client_factory: ClientFactory,
+) -> AsyncGenerator[aiohttp.ClientSession, None]:
+    """mTLS session for an admin created just for this probe"""
+    callsign, pfx = await create_admin(session_with_testcas, tp_issuer)
+    async with client_factory.session(client_factory.credentials.add(callsign, pfx)) as admin:
+        yield admin
+
+
+async def revoke_user(admin: aiohttp.ClientSession, callsign: str) -> None:
+    """DELETE the user"""
+    async with admin.delete(f"{mtls_url()}/{VER}/people/{callsign}", timeout=DEFAULT_TIMEOUT) as resp:
+        resp.raise_for_status()
+
+
+@pytest.mark.asyncio
+async def test_revocation_propagation(
+    probe_admin_session: aiohttp.ClientSession,
+    session_with_testcas: aiohttp.ClientSession,
+    client_factory: ClientFactory,
+) -> None:
+    """Enroll and revoke SAMPLES users one at a time, timing each layer from the DELETE returning"""
+    admin = probe_admin_session
+    probe = RevocationProbe(client_factory, API, mtls_url(), products=PRODUCTS, layers=LAYERS, deadline=DEADLINE)
+    for idx in range(SAMPLES):
+        user = await enroll_user(admin, session_with_testcas)
+        # Decode through the cache but do not keep it there, the credentials are about to be revoked
+        ssl_ctx = client_factory.credentials.add(user.callsign, user.pfx)
+        client_factory.credentials.discard(user.callsign)
+        subject = RevokedSubject.from_pfx(user.callsign, user.jwt, user.pfx, ssl_ctx)
+        await probe.wait_baseline(subject)
+        result = await probe.measure(subject, functools.partial(revoke_user, admin, subject.callsign))
+        LOGGER.info(
+            "Sample {}: {}".format(idx, ", ".join(f"{name}={elapsed:.3f}s" for name, elapsed in result.items()))
+        )
+
+    probe.timings.log_report()
+    if REPORT_PATH:
+        Path(REPORT_PATH).write_text(
+            json.dumps({"samples": SAMPLES, "layers": probe.report()}, indent=2), encoding="utf-8"
+        )
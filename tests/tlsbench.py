@@ -0,0 +1,235 @@
+"""RSA vs ECDSA: mTLS handshake CPU cost and certificate issuance time
+
+In memory, no network, CPU seconds spent on each side of full mTLS handshakes::
+
+    python -m tests.tlsbench --handshakes 200
+
+Full handshake latency against the running composition (rmnginx and productsnginx)::
+
+    python -m tests.tlsbench --target localmaeher.dev.pvarki.fi:4439 --target tak.localmaeher.dev.pvarki.fi:4626
+
+Reconnect storm of mTLS clients, counting OCSP responder requests from its log::
+
+    python -m tests.tlsbench --target mtls.localmaeher.dev.pvarki.fi:4439 --pfx USER.pfx --callsign USER \\
+        --handshakes 500 --concurrency 50 --count-cmd "docker compose logs ocsp"
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import logging
+import shlex
+import socket
+import ssl
+import subprocess  # nosec
+import time
+
+from cryptography.hazmat.primitives import serialization
+from libadvian.logging import init_logging
+
+from .benchcli import add_pfx_arguments, add_report_argument, log_results, parse_args, pfx_context, write_report
+from .clientpool import testcas_ssl_context
+from .conftest import CA_PATH
+from .keypool import UserKey, generate_key
+from .loadgen import percentile
+from .mtlscreds import MTLSCredentialCache, anonymous_file
+from .stubapi import StubCA
+
+LOGGER = logging.getLogger(__name__)
+KEYTYPES: Dict[str, Tuple[str, int]] = {"rsa2048": ("rsa", 2048), "rsa3072": ("rsa", 3072), "ecdsa": ("ecdsa", 0)}
+SERVER_NAME = "bench.localmaeher"
+
+
+def key_and_chain_pem(key: UserKey, *certs: Any) -> bytes:
+    """PEM with unencrypted key and the certificates"""
+    pem = key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    for cert in certs:
+        pem += cert.public_bytes(serialization.Encoding.PEM)
+    return pem
+
+
+def mtls_contexts(keytype: str, keysize: int) -> Tuple[ssl.SSLContext, ssl.SSLContext]:
+    """Server and client contexts that require and verify each other, all keys of the given type"""
+    ca = StubCA(keysize, keytype)
+    cadata = ca.cert.public_bytes(serialization.Encoding.PEM).decode("ascii")
+    server_key = generate_key(keytype, keysize)
+    client_key = generate_key(keytype, keysize)
+    server_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH, cadata=cadata)
+    server_ctx.verify_mode = ssl.CERT_REQUIRED
+    with anonymous_file(key_and_chain_pem(server_key, ca.issue_cert(SERVER_NAME, server_key, [SERVER_NAME]))) as path:
+        server_ctx.load_cert_chain(path)
+    client_ctx = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cadata=cadata)
+    with anonymous_file(key_and_chain_pem(client_key, ca.issue_cert("benchuser", client_key))) as path:
+        client_ctx.load_cert_chain(path)
+    return server_ctx, client_ctx
+
+
+def memory_handshake(server_ctx: ssl.SSLContext, client_ctx: ssl.SSLContext) -> Tuple[float, float]:
+    """One full handshake over memory BIOs, returns CPU seconds spent by (server, client)"""
+    c_in, c_out, s_in, s_out = ssl.MemoryBIO(), ssl.MemoryBIO(), ssl.MemoryBIO(), ssl.MemoryBIO()
+    client = client_ctx.wrap_bio(c_in, c_out, server_hostname=SERVER_NAME)
+    server = server_ctx.wrap_bio(s_in, s_out, server_side=True)
+    cpu = {"server": 0.0, "client": 0.0}
+    done = {"server": False, "client": False}
+    sides = {"server": server, "client": client}
+    while not all(done.values()):
+        for name, side in sides.items():
+            if done[name]:
+                continue
+            started = time.process_time()
+            try:
+                side.do_handshake()
+                done[name] = True
+            except ssl.SSLWantReadError:
+                pass
+            cpu[name] += time.process_time() - started
+        s_in.write(c_out.read())
+        c_in.write(s_out.read())
+    # TLS 1.3 servers check the client certificate after the clients last flight, make sure it got through
+    server.write(b"x")
+    c_in.write(s_out.read())
+    assert client.read(1) == b"x"
+    return cpu["server"], cpu["client"]
+
+
+def bench_handshakes(keytype: str, keysize: int, rounds: int) -> Dict[str, Any]:
+    """CPU per full mTLS handshake on both sides"""
+    server_ctx, client_ctx = mtls_contexts(keytype, keysize)
+    samples = [memory_handshake(server_ctx, client_ctx) for _ in range(rounds)]
+    server = [sample[0] for sample in samples]
+    client = [sample[1] for sample in samples]
+    return {
+        "server_cpu_p50": percentile(server, 50),
+        "server_cpu_p95": percentile(server, 95),
+        "client_cpu_p50": percentile(client, 50),
+        "server_handshakes_per_cpu_second": len(server) / sum(server),
+    }
+
+
+def bench_issuance(keytype: str, keysize: int, rounds: int) -> Dict[str, Any]:
+    """Keygen + sign + PKCS12 packaging, and the same with the key already generated"""
+    ca = StubCA(keysize, keytype)
+    full: List[float] = []
+    signing: List[float] = []
+    for idx in range(rounds):
+        started = time.perf_counter()
+        ca.issue_pfx(f"BENCH{idx}")
+        full.append(time.perf_counter() - started)
+        key = generate_key(keytype, keysize)
+        started = time.perf_counter()
+        ca.issue_pfx(f"BENCH{idx}", key)
+        signing.append(time.perf_counter() - started)
+    return {"issue_p50": percentile(full, 50), "issue_without_keygen_p50": percentile(signing, 50)}
+
+
+def timed_request(ssl_ctx: ssl.SSLContext, host: str, port: int, path: str) -> float:
+    """Seconds from TCP connected to the first response byte on a fresh TLS connection
+
+    With TLS 1.3 the server verifies the client certificate (and asks OCSP) only after the client thinks the
+    handshake is done, so the first response byte is where that cost shows up."""
+    with socket.create_connection((host, port), timeout=30) as sock:
+        started = time.perf_counter()
+        with ssl_ctx.wrap_socket(sock, server_hostname=host) as tls:
+            tls.sendall(f"HEAD {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode("ascii"))
+            tls.recv(1)
+            return time.perf_counter() - started
+
+
+def responder_requests(count_cmd: Optional[str]) -> Optional[int]:
+    """Lines printed by count_cmd (for example the OCSP responders log), None without a command"""
+    if not count_cmd:
+        return None
+    result = subprocess.run(shlex.split(count_cmd), capture_output=True, check=True)  # nosec
+    return len(result.stdout.splitlines())
+
+
+def bench_target(  # pylint: disable=too-many-arguments
+    target: str,
+    rounds: int,
+    *,
+    ssl_ctx: Optional[ssl.SSLContext] = None,
+    concurrency: int = 1,
+    path: str = "/",
+    count_cmd: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Latency of fresh TLS connections to host:port, concurrency > 1 simulates a reconnect storm"""
+    host, port = target.rsplit(":", 1)
+    if ssl_ctx is None:
+        ssl_ctx = testcas_ssl_context(CA_PATH)
+    before = responder_requests(count_cmd)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(lambda _: timed_request(ssl_ctx, host, int(port), path), range(rounds)))
+    wall_time = time.perf_counter() - started
+    after = responder_requests(count_cmd)
+    result: Dict[str, Any] = {
+        "target": target,
+        "concurrency": concurrency,
+        "first_byte_p50": percentile(latencies, 50),
+        "first_byte_p95": percentile(latencies, 95),
+        "first_byte_p99": percentile(latencies, 99),
+    }
+    if before is not None and after is not None:
+        result["responder_requests"] = after - before
+        result["responder_requests_per_second"] = (after - before) / wall_time
+    return result
+
+
+def run(keytypes: Sequence[str], handshakes: int, issuances: int) -> List[Dict[str, Any]]:
+    """In memory benchmarks for each key type"""
+    results = []
+    for name in keytypes:
+        keytype, keysize = KEYTYPES[name]
+        LOGGER.info("Benchmarking {}".format(name))
+        results.append(
+            {
+                "keytype": name,
+                **bench_handshakes(keytype, keysize, handshakes),
+                **bench_issuance(keytype, keysize, issuances),
+            }
+        )
+    return results
+
+
+def main() -> None:
+    """Run the benchmark from command line"""
+    parser = argparse.ArgumentParser(description="RSA vs ECDSA handshake and issuance benchmark")
+    parser.add_argument("--keytypes", default=",".join(KEYTYPES), help="Comma separated, from: " + ",".join(KEYTYPES))
+    parser.add_argument("--handshakes", type=int, default=200, help="Handshakes per key type")
+    parser.add_argument("--issuances", type=int, default=20, help="Issued PFX bundles per key type")
+    parser.add_argument("--target", action="append", default=[], help="host:port to measure handshakes against")
+    add_pfx_arguments(parser, "to present to --target")
+    parser.add_argument("--concurrency", type=int, default=1, help="Parallel connections against --target")
+    parser.add_argument("--path", default="/", help="Path to HEAD on --target")
+    parser.add_argument(
+        "--count-cmd",
+        help="Command whose output line count grows with responder requests, e.g. 'docker compose logs ocsp'",
+    )
+    add_report_argument(parser)
+    args = parse_args(parser)
+    init_logging(logging.INFO)
+    if args.target:
+        ssl_ctx = pfx_context(args, MTLSCredentialCache(CA_PATH))
+        results = [
+            bench_target(
+                target,
+                args.handshakes,
+                ssl_ctx=ssl_ctx,
+                concurrency=args.concurrency,
+                path=args.path,
+                count_cmd=args.count_cmd,
+            )
+            for target in args.target
+        ]
+    else:
+        results = run(args.keytypes.split(","), args.handshakes, args.issuances)
+    log_results(LOGGER, results, precision=5)
+    write_report(args.report, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""Bytes on the wire and time-to-interactive of the rmui SPA plus the product UI modules over a throttled link
+
+The UI loads in waves: index.html, the assets it references, then every product module under /ui/ (found the way
+the SPA does it, by walking the autoindex listings). Each request waits one round trip and all response bytes share
+the link bandwidth, requests within a wave run over --connections parallel connections.
+
+aiohttp only speaks HTTP/1.1, so this does not measure HTTP/2 multiplexing: the parallel connections approximate
+the streams a browser would open on one connection, byte counts are exact but timings are not what HTTP/2 gets::
+
+    python -m tests.uibench --link lte --link satellite \\
+        --modules https://mtls.localmaeher.dev.pvarki.fi:4439/ui/ --pfx USER.pfx --callsign USER
+    python -m tests.uibench --link satellite --identity  # without compression to see what it saves
+
+With --manifest the modules are found from /ui/manifest.json instead, one request for all products::
+
+    python -m tests.uibench --link satellite \\
+        --manifest https://mtls.localmaeher.dev.pvarki.fi:4439/ui/manifest.json --pfx USER.pfx --callsign USER
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from dataclasses import dataclass, field
+from urllib.parse import urljoin, urlsplit
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import re
+import ssl
+import time
+
+import aiohttp
+from libadvian.logging import init_logging
+
+from .benchcli import add_pfx_arguments, add_report_argument, log_results, parse_args, pfx_context, write_report
+from .clientpool import ClientFactory
+from .conftest import CA_PATH
+
+LOGGER = logging.getLogger(__name__)
+# name: (bits per second, round trip seconds)
+LINKS: Dict[str, Tuple[float, float]] = {
+    "lan": (1e9, 0.001),
+    "lte": (10e6, 0.05),
+    "3g": (1.5e6, 0.15),
+    "satellite": (2e6, 0.6),
+}
+ASSET_RE = re.compile(r"""(?:src|href)=["']([^"'#?]+\.(?:js|mjs|css|svg|png|woff2?|json|webmanifest))["']""")
+LISTING_RE = re.compile(r"""href=["']([^"'#?]+)["']""")
+MODULE_SUFFIXES = (".js", ".mjs", ".css", ".json")
+
+
+class ThrottledLink:  # pylint: disable=too-few-public-methods
+    """Shared bandwidth and a fixed round trip per request"""
+
+    def __init__(self, bandwidth: float, rtt: float) -> None:
+        self.bytes_per_second = bandwidth / 8.0
+        self.rtt = rtt
+        self._free_at = 0.0
+
+    async def transfer(self, size: int) -> None:
+        """Wait until size bytes have gone through the link after everything queued before them"""
+        now = time.perf_counter()
+        self._free_at = max(self._free_at, now) + size / self.bytes_per_second
+        await asyncio.sleep(self._free_at - now)
+
+
+@dataclass(frozen=True)
+class Fetch:
+    """One response as received"""
+
+    url: str
+    status: int
+    wire_bytes: int  # headers and body as sent, ie. compressed
+    body_bytes: int  # body after decompression
+    encoding: str
+
+
+@dataclass
+class PageLoad:
+    """Everything fetched for one load"""
+
+    fetches: List[Fetch] = field(default_factory=list)
+    waves: int = 0
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        """Totals for the report"""
+        return {
+            "requests": len(self.fetches),
+            "waves": self.waves,
+            "errors": sum(1 for fetch in self.fetches if fetch.status >= 400),
+            "wire_bytes": sum(fetch.wire_bytes for fetch in self.fetches),
+            "body_bytes": sum(fetch.body_bytes for fetch in self.fetches),
+            "compressed_responses": sum(1 for fetch in self.fetches if fetch.encoding),
+            "time_to_interactive": elapsed,
+        }
+
+
+class UILoader:
+    """Fetches the SPA and the product modules wave by wave over the throttled link"""
+
+    def __init__(
+        self, session: aiohttp.ClientSession, link: ThrottledLink, connections: int, identity: bool = False
+    ) -> None:
+        self.session = session
+        self.link = link
+        self.slots = asyncio.Semaphore(connections)
+        self.headers = {"Accept-Encoding": "identity" if identity else "gzip"}
+        self.load = PageLoad()
+
+    async def fetch(self, url: str) -> bytes:
+        """GET url, counted as it came over the wire, returns the decompressed body (empty on errors)"""
+        async with self.slots:
+            await asyncio.sleep(self.link.rtt)
+            async with self.session.get(url, headers=self.headers, auto_decompress=False) as resp:
+                raw = await resp.read()
+                header_bytes = sum(len(name) + len(value) + 4 for name, value in resp.raw_headers)
+                await self.link.transfer(header_bytes + len(raw))
+                encoding = resp.headers.get("Content-Encoding", "")
+                body = gzip.decompress(raw) if encoding == "gzip" else raw
+                self.load.fetches.append(Fetch(url, resp.status, header_bytes + len(raw), len(body), encoding))
+        if resp.status >= 400:
+            LOGGER.warning("{} returned {}".format(url, resp.status))
+            return b""
+        return body
+
+    async def wave(self, urls: Sequence[str]) -> List[bytes]:
+        """Fetch urls in parallel"""
+        self.load.waves += 1
+        return list(await asyncio.gather(*(self.fetch(url) for url in urls)))
+
+    async def spa(self, url: str) -> None:
+        """index.html and the assets it references"""
+        (index,) = await self.wave([url])
+        assets = sorted({urljoin(url, asset) for asset in ASSET_RE.findall(index.decode("utf-8", "replace"))})
+        if assets:
+            await self.wave(assets)
+
+    async def modules(self, url: str) -> None:
+        """Walk the autoindex listings under url level by level, then fetch every module file found"""
+        listings, files = [url], []
+        seen: Set[str] = set()
+        while listings:
+            found = []
+            for base, body in zip(listings, await self.wave(listings)):
+                for href in LISTING_RE.findall(body.decode("utf-8", "replace")):
+                    target = urljoin(base, href)
+                    if target in seen or not target.startswith(url) or urlsplit(target).path == urlsplit(base).path:
+                        continue
+                    seen.add(target)
+                    found.append(target)
+            listings = [target for target in found if target.endswith("/")]
+            files += [target for target in found if target.endswith(MODULE_SUFFIXES)]
+        if files:
+            await self.wave(files)
+
+    async def manifest(self, url: str) -> None:
+        """Fetch the module manifest, then every products entry module"""
+        (body,) = await self.wave([url])
+        products = json.loads(body)["products"] if body else {}
+        if products:
+            await self.wave([urljoin(url, product["entry"]) for product in products.values()])
+
+
+async def bench_ui(  # pylint: disable=too-many-arguments
+    factory: ClientFactory,
+    spa_url: str,
+    modules_url: Optional[str],
+    link: Tuple[float, float],
+    *,
+    manifest_url: Optional[str] = None,
+    connections: int = 6,
+    identity: bool = False,
+    ssl_ctx: Optional[ssl.SSLContext] = None,
+) -> Dict[str, Any]:
+    """One cold load of the SPA followed by the product modules"""
+    async with factory.session(ssl_ctx) as session:
+        loader = UILoader(session, ThrottledLink(*link), connections, identity)
+        started = time.perf_counter()
+        await loader.spa(spa_url)
+        if manifest_url:
+            await loader.manifest(manifest_url)
+        elif modules_url:
+            await loader.modules(modules_url)
+        return loader.load.summary(time.perf_counter() - started)
+
+
+async def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Benchmark each requested link profile"""
+    factory = ClientFactory(CA_PATH)
+    ssl_ctx = pfx_context(args, factory.credentials)
+    results = []
+    try:
+        for name in args.link:
+            result = await bench_ui(
+                factory,
+                args.spa,
+                args.modules,
+                LINKS[name],
+                manifest_url=args.manifest,
+                connections=args.connections,
+                identity=args.identity,
+                ssl_ctx=ssl_ctx,
+            )
+            results.append({"link": name, "encoding": "identity" if args.identity else "gzip", **result})
+    finally:
+        await factory.close()
+    return results
+
+
+def main() -> None:
+    """Run the benchmark from command line"""
+    parser = argparse.ArgumentParser(description="UI load bytes and time over a throttled link")
+    parser.add_argument("--spa", default="https://localmaeher.dev.pvarki.fi:4439/", help="SPA index URL")
+    parser.add_argument("--modules", help="Product UI modules root, the mtls host needs --pfx")
+    parser.add_argument("--manifest", help="Find the product modules from this manifest instead of --modules")
+    parser.add_argument("--link", action="append", choices=sorted(LINKS), help="Link profile(s), default lte")
+    parser.add_argument("--connections", type=int, default=6, help="Parallel requests within a wave")
+    parser.add_argument("--identity", action="store_true", help="Ask for uncompressed responses")
+    add_pfx_arguments(parser, "for the mtls host")
+    add_report_argument(parser)
+    args = parse_args(parser)
+    args.link = args.link or ["lte"]
+    init_logging(logging.INFO)
+    results = asyncio.run(run(args))
+    log_results(LOGGER, results)
+    write_report(args.report, results)
+
+
+if __name__ == "__main__":
+    main()
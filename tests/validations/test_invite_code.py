@@ -1,6 +1,7 @@
 """Tests enrollment invitecode validations"""
 
 from typing import Dict
+from dataclasses import dataclass
 import logging
 
 import aiohttp
@@ -8,17 +9,16 @@ import pytest
 
 from ..conftest import DEFAULT_TIMEOUT, API, VER
 
-
 LOGGER = logging.getLogger(__name__)
 pytestmark = pytest.mark.skip(reason="somethings flaky")
 # pylint: disable=R0801
 
 
-# pylint: disable=too-few-public-methods
+@dataclass
 class ValueStorage:
     """Storage for invite_code generated in this testsuite"""
 
-    invite_code = ""
+    invite_code: str = ""
 
 
 @pytest.mark.asyncio
@@ -96,6 +96,7 @@ async def test_invalid_session_in_invite_code_create(
 @pytest.mark.asyncio
 async def test_valid_invite_code_create(
     admin_jwt_session: aiohttp.ClientSession,
+    values: ValueStorage,
 ) -> None:
     """Tests that we can create a new invite code using jwt"""
     client = admin_jwt_session
@@ -107,7 +108,7 @@ async def test_valid_invite_code_create(
     payload = await response.json()
     LOGGER.debug("payload={}".format(payload))
     assert payload["invite_code"] != ""
-    ValueStorage.invite_code = payload["invite_code"]
+    values.invite_code = payload["invite_code"]
 
 
 @pytest.mark.asyncio
@@ -143,10 +144,11 @@ async def test_validity_of_invalid_invite_code(
 @pytest.mark.asyncio
 async def test_validity_of_valid_invite_code(
     session_with_testcas: aiohttp.ClientSession,
+    values: ValueStorage,
 ) -> None:
     """Tests that we can verify valid invite code"""
     client = session_with_testcas
-    url = f"{API}/{VER}/enrollment/invitecode?invitecode={ValueStorage.invite_code}"
+    url = f"{API}/{VER}/enrollment/invitecode?invitecode={values.invite_code}"
     LOGGER.debug("Fetching {}".format(url))
     response = await client.get(url, timeout=DEFAULT_TIMEOUT)
     response.raise_for_status()
@@ -158,12 +160,13 @@ async def test_validity_of_valid_invite_code(
 @pytest.mark.asyncio
 async def test_deactivate_valid_invite_code(
     admin_jwt_session: aiohttp.ClientSession,
+    values: ValueStorage,
 ) -> None:
     """Tests that we can deactivate valid invite code"""
     client = admin_jwt_session
     url = f"{API}/{VER}/enrollment/invitecode/deactivate"
     data = {
-        "invite_code": f"{ValueStorage.invite_code}",
+        "invite_code": f"{values.invite_code}",
     }
     LOGGER.debug("Fetching {}".format(url))
     response = await client.put(url, json=data, timeout=DEFAULT_TIMEOUT)
@@ -176,10 +179,11 @@ async def test_deactivate_valid_invite_code(
 @pytest.mark.asyncio
 async def test_valid_invite_code_is_not_active(
     session_with_testcas: aiohttp.ClientSession,
+    values: ValueStorage,
 ) -> None:
     """Tests that we can verify valid invite code"""
     client = session_with_testcas
-    url = f"{API}/{VER}/enrollment/invitecode?invitecode={ValueStorage.invite_code}"
+    url = f"{API}/{VER}/enrollment/invitecode?invitecode={values.invite_code}"
     LOGGER.debug("Fetching {}".format(url))
     response = await client.get(url, timeout=DEFAULT_TIMEOUT)
     response.raise_for_status()
@@ -191,12 +195,13 @@ async def test_valid_invite_code_is_not_active(
 @pytest.mark.asyncio
 async def test_activate_valid_invite_code(
     admin_jwt_session: aiohttp.ClientSession,
+    values: ValueStorage,
 ) -> None:
     """Tests that we can activate valid invite code"""
     client = admin_jwt_session
     url = f"{API}/{VER}/enrollment/invitecode/activate"
     data = {
-        "invite_code": f"{ValueStorage.invite_code}",
+        "invite_code": f"{values.invite_code}",
     }
     LOGGER.debug("Fetching {}".format(url))
     response = await client.put(url, json=data, timeout=DEFAULT_TIMEOUT)
@@ -209,10 +214,11 @@ async def test_activate_valid_invite_code(
 @pytest.mark.asyncio
 async def test_valid_invite_code_is_active(
     session_with_testcas: aiohttp.ClientSession,
+    values: ValueStorage,
 ) -> None:
     """Tests that we can verify valid invite code"""
     client = session_with_testcas
-    url = f"{API}/{VER}/enrollment/invitecode?invitecode={ValueStorage.invite_code}"
+    url = f"{API}/{VER}/enrollment/invitecode?invitecode={values.invite_code}"
     LOGGER.debug("Fetching {}".format(url))
     response = await client.get(url, timeout=DEFAULT_TIMEOUT)
     response.raise_for_status()
@@ -0,0 +1,75 @@
+"""Poll for conditions with backoff instead of sleeping a fixed time and hoping for the best"""
+
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+import random
+import time
+
+from .loadgen import percentile
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ConditionTimeout(AssertionError):
+    """Condition did not become true before the deadline"""
+
+
+class ConditionTimings:
+    """How long each named condition took to become true"""
+
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = {}
+
+    def record(self, name: str, elapsed: float) -> None:
+        """Add a sample"""
+        self.samples.setdefault(name, []).append(elapsed)
+
+    def log_report(self) -> None:
+        """Log the distribution for each condition"""
+        for name, samples in self.samples.items():
+            LOGGER.info(
+                "{}: n={} p50={:.3f}s p95={:.3f}s max={:.3f}s".format(
+                    name, len(samples), percentile(samples, 50), percentile(samples, 95), max(samples)
+                )
+            )
+
+
+async def wait_until(  # pylint: disable=too-many-arguments
+    condition: Callable[[], Awaitable[bool]],
+    *,
+    name: str = "condition",
+    deadline: float = 30.0,
+    initial_delay: float = 0.05,
+    factor: float = 2.0,
+    max_delay: float = 2.0,
+    jitter: float = 0.1,
+    timings: Optional[ConditionTimings] = None,
+) -> float:
+    """Await condition until it returns True, returns the seconds it took
+
+    Delays between attempts grow exponentially from initial_delay up to max_delay, each randomized by +-jitter
+    (fraction of the delay). Raises ConditionTimeout if the condition is still false after deadline seconds, an
+    attempt still running at the deadline is cancelled."""
+    started = time.perf_counter()
+    delay = initial_delay
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            done = await asyncio.wait_for(condition(), max(deadline - (time.perf_counter() - started), 0.0))
+        except asyncio.TimeoutError:
+            if time.perf_counter() - started < deadline:
+                raise  # The condition timed out on its own
+            raise ConditionTimeout(f"{name} still pending after {deadline}s ({attempts} attempts)") from None
+        if done:
+            elapsed = time.perf_counter() - started
+            LOGGER.debug("{} became true after {:.3f}s ({} attempts)".format(name, elapsed, attempts))
+            if timings is not None:
+                timings.record(name, elapsed)
+            return elapsed
+        remaining = deadline - (time.perf_counter() - started)
+        if remaining <= 0.0:
+            raise ConditionTimeout(f"{name} still false after {deadline}s ({attempts} attempts)")
+        await asyncio.sleep(min(remaining, delay * random.uniform(1.0 - jitter, 1.0 + jitter)))
+        delay = min(delay * factor, max_delay)